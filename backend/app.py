@@ -1,34 +1,54 @@
 from __future__ import annotations
 
+import os
+import itertools
+import multiprocessing
+import mmap
 import subprocess
 import shutil
+import tempfile
 import uuid
 import zipfile
+import zlib
 import re
 import json
+import queue
 import gzip
+import hashlib
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterable, Iterator, Optional
+from urllib.parse import unquote
 from datetime import datetime
 import sqlite3
 import io
+from collections import deque
+from collections.abc import Hashable
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
 
-from PIL import Image
+from PIL import Image, ImageOps, ImageSequence
 
 from flask import (
     Flask,
     abort,
     after_this_request,
     jsonify,
+    render_template,
     request,
     send_file,
+    Request,
     Response,
 )
 from flask_cors import CORS
+from werkzeug.datastructures import FileStorage
 from werkzeug.exceptions import HTTPException
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+from werkzeug.utils import send_file as werkzeug_send_file
 
 try:
     from lottie.exporters.gif import export_gif
+    from lottie.exporters.cairo import export_png as lottie_export_png
     from lottie import objects
     HAS_LOTTIE = True
 except ImportError:
@@ -41,6 +61,36 @@ try:
 except ImportError:
     HAS_REMBG = False
 
+# OpenCV (a rembg dependency) has SIMD area-averaging kernels for downscaling
+try:
+    import cv2
+    import numpy as np
+    HAS_CV2 = True
+except ImportError:
+    HAS_CV2 = False
+
+# Brotli is optional; pre-compressed pages fall back to gzip without it
+try:
+    import brotli
+    HAS_BROTLI = True
+except ImportError:
+    HAS_BROTLI = False
+
+# orjson parses the large, deeply nested Lottie JSON inside TGS files several
+# times faster than the stdlib; optional, json.loads is used without it
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# fcntl (POSIX only) gives access to the FICLONE reflink ioctl
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
 import time
 import threading
 import gc
@@ -93,10 +143,32 @@ BASE_DIR = Path(__file__).parent
 DATA_DIR = BASE_DIR / "data"
 UPLOAD_DIR = DATA_DIR / "uploads"
 OUTPUT_DIR = DATA_DIR / "converted"
-
-for directory in (UPLOAD_DIR, OUTPUT_DIR):
+INCOMING_DIR = DATA_DIR / "incoming"
+# Per-request batch directories (inputs, intermediates, outputs before zipping).
+# Point SCRATCH_DIR at a tmpfs such as /dev/shm/video-speed to keep them in RAM;
+# it is opt-in because tmpfs size is bounded by memory.
+SCRATCH_DIR = Path(os.environ["SCRATCH_DIR"]) if os.environ.get("SCRATCH_DIR") else OUTPUT_DIR
+# Batch resize outputs keyed by input content and options (see _cached_convert)
+# and WebM → GIF palettes. CONVERSION_CACHE_MB=0 turns the cache off.
+CACHE_DIR = DATA_DIR / "cache"
+# One-shot results handed to the fronting web server (see _send_output).
+HANDOFF_DIR = OUTPUT_DIR / "handoff"
+CONVERSION_CACHE_BYTES = int(os.environ.get("CONVERSION_CACHE_MB", "1024")) * 1024 * 1024
+
+for directory in (UPLOAD_DIR, OUTPUT_DIR, INCOMING_DIR, SCRATCH_DIR, CACHE_DIR, HANDOFF_DIR):
     directory.mkdir(parents=True, exist_ok=True)
 
+_scratch_counter = itertools.count()
+
+
+def _scratch_id() -> str:
+    """Name for a per-request scratch directory.
+
+    Scratch names only need to be unique on this host, so pid + counter + clock
+    is enough; download IDs that end up in URLs keep using ``uuid4``.
+    """
+    return f"{os.getpid():x}-{next(_scratch_counter):x}-{time.monotonic_ns() & 0xFFFFFFFF:x}"
+
 # Auto-detect ffmpeg path (works on Mac/Homebrew and Linux)
 FFMPEG_PATH = shutil.which("ffmpeg")
 if not FFMPEG_PATH:
@@ -113,40 +185,229 @@ if not FFMPEG_PATH or not Path(FFMPEG_PATH).exists():
 MIN_FPS = 1
 MAX_FPS = 60
 MAX_DURATION = 3600
+MAX_PREVIEW_DURATION = 30
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 MAX_WEBP_DURATION = 3600
+# Audio files converted by one ffmpeg process in /batch-audio-to-ogg-zip; each
+# input holds a decoder and an open file, so keep groups modest.
+AUDIO_BATCH_INPUTS = 32
+# Largest request body accepted (MAX_UPLOAD_MB, default 1 GiB). Oversized
+# uploads are refused from their Content-Length before the body is read.
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_MB", "1024")) * 1024 * 1024
+
+# H.264 encoder for /convert and /export. "auto" picks the first hardware
+# encoder that can actually open a session on this host and falls back to
+# libx264; set VIDEO_ENCODER to pin one (e.g. "libx264" to disable hardware).
+VIDEO_ENCODER = os.environ.get("VIDEO_ENCODER", "auto").strip().lower()
+H264_ENCODER_ARGS: dict[str, list[str]] = {
+    "h264_nvenc": ["-preset", "p4", "-tune", "ll", "-cq", "23"],
+    "h264_qsv": ["-pix_fmt", "nv12", "-global_quality", "23"],
+    "h264_videotoolbox": ["-q:v", "65"],
+    # "faster" costs a little encode time over "ultrafast" but gives far smaller
+    # files at the same CRF; the live preview stream keeps "ultrafast".
+    "libx264": ["-preset", "faster", "-crf", "23"],
+}
+
+# Persistent files (uploads) can be handed to a fronting web server instead of
+# being read back through Python: X_ACCEL_REDIRECT_PREFIX is the nginx
+# ``internal`` location aliased to DATA_DIR, USE_X_SENDFILE=1 emits X-Sendfile
+# for Apache/lighttpd. One-shot outputs and batch ZIPs parked for a later
+# download are handed over too; since the proxy reads them after the response
+# has left Flask, they are swept after PARKED_ZIP_TTL seconds instead of being
+# deleted on download.
+X_ACCEL_REDIRECT_PREFIX = os.environ.get("X_ACCEL_REDIRECT_PREFIX", "").rstrip("/")
+USE_X_SENDFILE = os.environ.get("USE_X_SENDFILE", "").strip().lower() in {"1", "true", "yes", "on"}
+PARKED_ZIP_TTL = int(os.environ.get("PARKED_ZIP_TTL", "3600"))
+# Target-size resizes of animated WebP keep every scaled frame decoded (RGBA,
+# frames × width × height × 4 bytes) while they search for a quality; larger
+# animations are staged as PNG files on disk instead.
+ANIMATED_SEARCH_MAX_BYTES = int(os.environ.get("ANIMATED_SEARCH_MAX_MB", "256")) * 1024 * 1024
+
+# gunicorn runs WEB_CONCURRENCY copies of this module (see gunicorn.conf.py),
+# each with its own batch pool, so each one sizes its pool to its share of the
+# cores rather than to the whole machine.
+PROCESS_CORES = max(1, (os.cpu_count() or 1) // (int(os.environ.get("WEB_CONCURRENCY", "0")) or 1))
+
+# Batch endpoints fan out one conversion per uploaded file. The encoders run
+# inside ffmpeg subprocesses, so worker threads are enough to keep every core
+# busy without pickling inputs across processes. BATCH_WORKERS overrides the
+# one-per-core default.
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", "0")) or PROCESS_CORES
+
+# ffmpeg sizes its decoder, filter and encoder threads to the whole machine by
+# default, so BATCH_WORKERS concurrent ffmpegs would oversubscribe every core.
+# Each batch worker instead gets an equal share of this process's cores.
+FFMPEG_BATCH_THREADS = max(1, PROCESS_CORES // BATCH_WORKERS)
+_worker_state = threading.local()
+
+
+def _pin_ffmpeg_threads() -> None:
+    _worker_state.ffmpeg_threads = FFMPEG_BATCH_THREADS
+
+
+_batch_executor = ThreadPoolExecutor(
+    max_workers=BATCH_WORKERS, thread_name_prefix="batch", initializer=_pin_ffmpeg_threads
+)
+
+# Deleting a batch directory is one unlink per file; do it off the request
+# thread so the worker is free for the next request as soon as it responds.
+_cleanup_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cleanup")
+
+
+def _remove_tree_later(path: Path) -> None:
+    _cleanup_executor.submit(shutil.rmtree, path, ignore_errors=True)
+
+
+class UploadRequest(Request):
+    """Request that spools multipart file parts into ``INCOMING_DIR``.
+
+    Werkzeug's default parks parts in memory or in an anonymous temp file, so
+    every upload had to be copied once more into its batch directory. Named
+    files on the data volume let ``_save_upload`` hard-link them into place.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.NamedTemporaryFile("wb+", dir=INCOMING_DIR, prefix="part_")
+
 
 app = Flask(__name__)
+app.request_class = UploadRequest
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES
 CORS(app)  # Enable CORS for frontend
 
+
+@app.before_request
+def _reject_oversized_upload():
+    # Werkzeug enforces MAX_CONTENT_LENGTH only once the body is read (and also
+    # covers chunked uploads); checking the header here answers 413 up front.
+    if request.content_length is not None and request.content_length > MAX_UPLOAD_BYTES:
+        abort(413, f"Dung lượng upload vượt quá {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+
 DB_PATH = DATA_DIR / "logs.db"
 
 
 def get_db_connection():
     """Create and return a database connection."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    # WAL (set once in init_db) only needs an fsync at checkpoints with
+    # synchronous=NORMAL; writers wait for the lock instead of failing.
+    conn.executescript(
+        "PRAGMA synchronous=NORMAL; PRAGMA busy_timeout=5000;"
+        " PRAGMA cache_size=-20000; PRAGMA temp_store=MEMORY;"
+    )
     return conn
 
+
+# SQLite allows one writer at a time anyway, so writes share a single
+# connection under a lock; reads reuse pooled connections. Connections are
+# opened on first use, so every gunicorn worker process has its own.
+_db_write_lock = threading.Lock()
+_db_writer_conn: sqlite3.Connection | None = None
+_db_readers: queue.Queue[sqlite3.Connection] = queue.Queue(maxsize=os.cpu_count() or 2)
+
+
+@contextmanager
+def db_writer() -> Iterator[sqlite3.Connection]:
+    """Yield the write connection; the block commits, or rolls back on error."""
+    global _db_writer_conn
+    with _db_write_lock:
+        if _db_writer_conn is None:
+            _db_writer_conn = get_db_connection()
+        with _db_writer_conn as conn:
+            yield conn
+
+
+@contextmanager
+def db_reader() -> Iterator[sqlite3.Connection]:
+    """Yield a pooled read connection."""
+    try:
+        conn = _db_readers.get_nowait()
+    except queue.Empty:
+        conn = get_db_connection()
+    try:
+        yield conn
+    finally:
+        try:
+            _db_readers.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
 def init_db():
     """Initialize the database with the logs table."""
-    conn = get_db_connection()
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            event_name TEXT NOT NULL,
-            device_name TEXT,
-            version_code TEXT,
-            params TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    with db_writer() as conn:
+        # Persistent on the database file: readers no longer block the log writers.
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                event_name TEXT NOT NULL,
+                device_name TEXT,
+                version_code TEXT,
+                params TEXT
+            )
+        ''')
 
 # Initialize database on startup
 init_db()
 
 
+# Log events are written by a background thread that commits them in batches:
+# one transaction per burst of requests instead of one per row. Rows still
+# queued when the process dies (at most ~LOG_FLUSH_INTERVAL worth) are lost.
+LOG_FLUSH_INTERVAL = 0.1
+LOG_FLUSH_BATCH = 500
+# Rows are numbered as they are queued; clear_logs() drops everything numbered
+# below _log_cleared_below, including a batch the flusher already dequeued.
+_log_queue: queue.Queue[tuple[int, tuple[str, str, str, str, str]]] = queue.Queue()
+_log_seq = itertools.count()
+_log_cleared_below = 0
+
+
+def enqueue_log(event_name: str, device_name: str, version_code: str, params: str) -> str:
+    """Queue a row for the logs table and return its timestamp."""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    _log_queue.put((next(_log_seq), (timestamp, event_name, device_name, version_code, params)))
+    return timestamp
+
+
+def clear_logs() -> None:
+    """Delete every stored log row, and every row still waiting to be stored."""
+    global _log_cleared_below
+    with db_writer() as conn:
+        _log_cleared_below = next(_log_seq)
+        while True:
+            try:
+                _log_queue.get_nowait()
+            except queue.Empty:
+                break
+        conn.execute("DELETE FROM logs")
+
+
+def _flush_logs_forever() -> None:
+    while True:
+        queued = [_log_queue.get()]
+        deadline = time.monotonic() + LOG_FLUSH_INTERVAL
+        while len(queued) < LOG_FLUSH_BATCH:
+            try:
+                queued.append(_log_queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        try:
+            with db_writer() as conn:
+                rows = [row for seq, row in queued if seq >= _log_cleared_below]
+                conn.executemany(
+                    'INSERT INTO logs (timestamp, event_name, device_name, version_code, params) VALUES (?, ?, ?, ?, ?)',
+                    rows,
+                )
+        except sqlite3.Error as e:
+            print(f"Log flush error ({len(queued)} rows dropped): {e}")
+
+
+threading.Thread(target=_flush_logs_forever, name="log-flusher", daemon=True).start()
+
+
 # ---------------------------- Helpers -------------------------------------
 
 def _validate_fps(raw_fps):
@@ -246,27 +507,79 @@ def _run_ffmpeg(cmd):
 
 # ---------------------------- Helpers -------------------------------------
 
-def _validate_fps(raw_fps: Optional[str | int]) -> int:
+class ValidationError(ValueError):
+    """A request parameter failed validation; the message is shown to the client."""
+
+
+# The parsers below are pure, so their results are memoized: batch endpoints
+# validate the same handful of fps/width/quality values over and over. Errors
+# are raised rather than aborted (lru_cache does not cache exceptions) and
+# turned into 400 responses by the _validate_* wrappers.
+
+
+_FPS_RANGE_MSG = f"FPS phải nằm trong khoảng {MIN_FPS}-{MAX_FPS}"
+_DURATION_RANGE_MSG = f"Thời lượng phải trong khoảng 1-{MAX_DURATION} giây"
+
+
+@lru_cache(maxsize=256)
+def _range_message(name: str, min_value: int, max_value: int) -> str:
+    return f"{name} phải nằm trong khoảng {min_value}-{max_value}"
+
+
+def _hashable(raw: object) -> object:
+    """Map unhashable JSON values (lists, objects) to None, which is as invalid."""
+    return raw if isinstance(raw, Hashable) else None
+
+
+@lru_cache(maxsize=1024)
+def _parse_fps(raw_fps: Optional[str | int]) -> int:
     try:
         fps = int(raw_fps)
     except (TypeError, ValueError):
-        abort(400, "FPS không hợp lệ")
-
+        raise ValidationError("FPS không hợp lệ") from None
     if not (MIN_FPS <= fps <= MAX_FPS):
-        abort(400, f"FPS phải nằm trong khoảng {MIN_FPS}-{MAX_FPS}")
+        raise ValidationError(_FPS_RANGE_MSG)
     return fps
 
 
-def _validate_duration(raw: Optional[str | int]) -> int:
+@lru_cache(maxsize=1024)
+def _parse_duration(raw: Optional[str | int]) -> int:
     try:
         val = int(raw)
     except (TypeError, ValueError):
-        abort(400, "Thời lượng không hợp lệ")
+        raise ValidationError("Thời lượng không hợp lệ") from None
     if not (1 <= val <= MAX_DURATION):
-        abort(400, f"Thời lượng phải trong khoảng 1-{MAX_DURATION} giây")
+        raise ValidationError(_DURATION_RANGE_MSG)
     return val
 
 
+@lru_cache(maxsize=1024)
+def _parse_positive_int(
+    raw: Optional[str | int], name: str, min_value: int, max_value: int
+) -> int:
+    try:
+        val = int(raw)
+    except (TypeError, ValueError):
+        raise ValidationError(f"{name} không hợp lệ") from None
+    if not (min_value <= val <= max_value):
+        raise ValidationError(_range_message(name, min_value, max_value))
+    return val
+
+
+def _validate_fps(raw_fps: Optional[str | int]) -> int:
+    try:
+        return _parse_fps(_hashable(raw_fps))
+    except ValidationError as exc:
+        abort(400, str(exc))
+
+
+def _validate_duration(raw: Optional[str | int]) -> int:
+    try:
+        return _parse_duration(_hashable(raw))
+    except ValidationError as exc:
+        abort(400, str(exc))
+
+
 def _safe_upload_path(filename: str, base: Path) -> Path:
     """Prevent path traversal by resolving the final location."""
     candidate = (base / filename).resolve()
@@ -285,16 +598,13 @@ def _validate_positive_int(
     max_value: int,
 ) -> int:
     try:
-        val = int(raw)
-    except (TypeError, ValueError):
-        abort(400, f"{name} không hợp lệ")
-    if not (min_value <= val <= max_value):
-        abort(400, f"{name} phải nằm trong khoảng {min_value}-{max_value}")
-    return val
+        return _parse_positive_int(_hashable(raw), name, min_value, max_value)
+    except ValidationError as exc:
+        abort(400, str(exc))
 
 
 def _allowed_image_suffix(filename: str) -> str | None:
-    suffix = (Path(filename).suffix or "").lower()
+    suffix = _suffix_lower(filename)
     if suffix in {".png", ".jpg", ".jpeg", ".webp"}:
         return suffix
     return None
@@ -635,14 +945,14 @@ def _parse_hex_color(hex_color: str) -> tuple:
 
 
 def _allowed_static_image_suffix(filename: str) -> str | None:
-    suffix = (Path(filename).suffix or "").lower()
+    suffix = _suffix_lower(filename)
     if suffix in {".png", ".jpg", ".jpeg", ".webp"}:
         return suffix
     return None
 
 
 def _allowed_gif_suffix(filename: str) -> str | None:
-    suffix = (Path(filename).suffix or "").lower()
+    suffix = _suffix_lower(filename)
     if suffix == ".gif":
         return suffix
     return None
@@ -650,24 +960,264 @@ def _allowed_gif_suffix(filename: str) -> str | None:
 
 def _allowed_audio_suffix(filename: str) -> str | None:
     """Check if filename has a supported audio extension."""
-    suffix = (Path(filename).suffix or "").lower()
+    suffix = _suffix_lower(filename)
     if suffix in {".mp3", ".wav", ".aac", ".flac", ".m4a", ".ogg", ".wma", ".opus"}:
         return suffix
     return None
 
 
-_ZIP_NAME_SAFE_RE = re.compile(r"[^a-zA-Z0-9._-]+")
+_STATIC_IMAGE_FORMATS = {"png", "jpeg", "webp"}
+
+
+def _sniff_upload(file: FileStorage) -> str | None:
+    """Identify an uploaded file from its first bytes, rewinding the stream.
+
+    Returns ``"gif"``, ``"webp"``, ``"png"``, ``"jpeg"``, ``"webm"`` or
+    ``"gzip"`` (TGS), or None for anything else. Batch endpoints use it to turn
+    away junk before any conversion is queued, instead of paying an ffmpeg
+    start-up to find out.
+    """
+    head = file.stream.read(12)
+    file.stream.seek(0)
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return "webm"
+    if head.startswith(b"\x1f\x8b"):
+        return "gzip"
+    return None
+
+
+def _stem(filename: str) -> str:
+    """``Path(filename).stem`` on the raw string, without building a Path per file."""
+    name = filename.rpartition("/")[2]
+    stem, dot, _ = name.rpartition(".")
+    return stem if dot and stem else name
+
+
+def _suffix_lower(filename: str) -> str:
+    """``Path(filename).suffix.lower()`` on the raw string, like ``_stem``."""
+    name = filename.rpartition("/")[2]
+    stem, dot, ext = name.rpartition(".")
+    return f".{ext.lower()}" if dot and stem and ext else ""
+
+
+# Maps every ASCII character outside [a-zA-Z0-9._-] to NUL; runs of NULs are
+# then collapsed into one "_" (see _sanitize_zip_stem).
+_ZIP_NAME_UNSAFE = str.maketrans(
+    {c: "\0" for c in map(chr, range(128)) if not (c.isalnum() or c in "._-")}
+)
+_UPLOAD_SUFFIX_RE = re.compile(r"\.[A-Za-z0-9]{1,8}")
+
+
+def _save_upload(file: FileStorage, dst: Path) -> None:
+    """Put an uploaded file at ``dst``.
+
+    Parts spooled by ``UploadRequest`` are linked or reflinked (see
+    ``_link_or_copy``). Anything else is copied in ``UPLOAD_CHUNK_SIZE`` blocks;
+    ``FileStorage.save`` uses a 16 KiB buffer, and large video uploads go much
+    faster with fewer, bigger reads and writes.
+    """
+    spooled = getattr(file.stream, "name", None)
+    if isinstance(spooled, str) and Path(spooled).parent == INCOMING_DIR:
+        # Already on disk (see UploadRequest): share its blocks instead of
+        # streaming the bytes through Python.
+        file.stream.flush()
+        _link_or_copy(Path(spooled), dst)
+        return
+    with open(dst, "wb", buffering=0) as out:
+        shutil.copyfileobj(file.stream, out, UPLOAD_CHUNK_SIZE)
+
+
+_FICLONE = 0x40049409  # linux/fs.h
+
+
+def _link_or_copy(src: Path, dst: Path) -> None:
+    """Make ``dst`` share ``src``'s data without copying it where possible.
+
+    Tries a hard link, then a reflink (``FICLONE``, on btrfs/XFS, for when
+    hard links are not allowed), and only then copies the bytes. Raises
+    FileExistsError if the hard link finds ``dst`` taken; the fallbacks write
+    a temp file next to ``dst`` and rename it over, so a ``dst`` that other
+    files are hard-linked to is never truncated in place.
+    """
+    try:
+        os.link(src, dst)
+        return
+    except (FileNotFoundError, FileExistsError):
+        raise
+    except OSError:
+        pass
+    tmp = dst.with_name(f".{dst.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        cloned = False
+        if HAS_FCNTL:
+            try:
+                with open(src, "rb") as source, open(tmp, "wb") as target:
+                    fcntl.ioctl(target.fileno(), _FICLONE, source.fileno())
+                cloned = True
+            except OSError:
+                pass
+        if not cloned:
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def _cached_convert(convert: Callable[..., Path], input_path: Path, *, output_path: Path, **options) -> Path:
+    """Run ``convert(input_path, output_path=output_path, **options)`` through a cache.
+
+    Entries are keyed by the SHA-256 of the input plus the converter and its
+    options, so re-uploading the same file with the same settings skips the
+    conversion. Entries are hard links to the outputs, so storing and reusing
+    them copies nothing when CACHE_DIR shares a file system with SCRATCH_DIR.
+    """
+    if CONVERSION_CACHE_BYTES <= 0:
+        return convert(input_path, output_path=output_path, **options)
+    with open(input_path, "rb") as src:
+        digest = hashlib.file_digest(src, "sha256")
+    digest.update(repr((convert.__name__, sorted(options.items()))).encode())
+    cache_path = CACHE_DIR / f"{digest.hexdigest()}{output_path.suffix}"
+    try:
+        _link_or_copy(cache_path, output_path)
+    except FileNotFoundError:
+        pass
+    else:
+        try:
+            os.utime(cache_path)  # mtime orders eviction
+        except OSError:
+            pass  # trimmed since; output_path already has the data
+        return output_path
+
+    convert(input_path, output_path=output_path, **options)
+    try:
+        _link_or_copy(output_path, cache_path)
+    except OSError:
+        return output_path  # another request stored it first
+    _cleanup_executor.submit(_trim_conversion_cache)
+    return output_path
+
+
+def _trim_conversion_cache() -> None:
+    """Evict the least recently used entries until the cache fits its budget."""
+    entries: list[tuple[float, int, str]] = []
+    for entry in os.scandir(CACHE_DIR):
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= CONVERSION_CACHE_BYTES:
+            break
+        try:
+            os.unlink(path)
+        except OSError:
+            continue
+        total -= size
+
+
+def _single_upload() -> Optional[FileStorage]:
+    """Return the uploaded file for single-file endpoints.
+
+    Accepts either a multipart ``file`` field or the raw file as the request
+    body (``application/octet-stream``) with its URL-encoded name in the
+    ``X-Original-Name`` header; scalar options then travel in the query string.
+    """
+    if request.mimetype != "application/octet-stream":
+        return request.files.get("file")
+    return FileStorage(
+        stream=request.stream,
+        filename=unquote(request.headers.get("X-Original-Name", "")),
+    )
+
+
+def _iter_multipart_uploads(dst_dir: Path) -> Iterator[tuple[str, Optional[str], str | Path]]:
+    """Parse a multipart request body while it is still arriving.
+
+    Yields ``(name, None, value)`` for form fields and ``(name, filename, path)``
+    as soon as a file part has been written to ``dst_dir``, so batch endpoints
+    can start converting the first file while the rest is still uploading
+    (``request.files`` only returns once the whole body has been read).
+    """
+    boundary = request.mimetype_params.get("boundary", "").encode("latin-1")
+    if request.mimetype != "multipart/form-data" or not boundary:
+        abort(400, "Yêu cầu phải là multipart/form-data")
+
+    decoder = MultipartDecoder(
+        boundary, request.max_form_memory_size, max_parts=request.max_form_parts
+    )
+    stream = request.stream
+    part: Field | File | None = None
+    chunks: list[bytes] = []
+    out = None
+    path: Path | None = None
+    count = 0
+    try:
+        while True:
+            event = decoder.next_event()
+            if isinstance(event, NeedData):
+                if decoder.complete:
+                    abort(400, "Dữ liệu upload bị gián đoạn")
+                # Keep reads well under max_form_memory_size, which the decoder
+                # applies to its whole buffer (file data included).
+                decoder.receive_data(stream.read(64 * 1024) or None)
+                continue
+            if isinstance(event, Epilogue):
+                return
+            if isinstance(event, File):
+                part = event
+                count += 1
+                path = dst_dir / f"part_{count:04d}"
+                out = open(path, "wb", buffering=0)
+            elif isinstance(event, Field):
+                part = event
+                chunks = []
+            elif isinstance(event, Data):
+                if out is not None:
+                    out.write(event.data)
+                else:
+                    chunks.append(event.data)
+                if event.more_data:
+                    continue
+                if out is not None:
+                    out.close()
+                    out = None
+                    yield part.name, part.filename, path
+                else:
+                    yield part.name, None, b"".join(chunks).decode("utf-8", "replace")
+    finally:
+        if out is not None:
+            out.close()
+
+
+def _sanitize_zip_stem(stem: str) -> str:
+    """Replace each run of characters outside [a-zA-Z0-9._-] with one "_"."""
+    # Non-ASCII characters become "?" first, which the table then maps away.
+    ascii_stem = stem.encode("ascii", "replace").decode("ascii")
+    return "_".join(filter(None, ascii_stem.translate(_ZIP_NAME_UNSAFE).split("\0")))
 
 
+@lru_cache(maxsize=4096)
 def _safe_zip_entry_name(raw_stem: str, *, index: int) -> str:
     stem = (raw_stem or "").strip() or f"image_{index:04d}"
-    stem = _ZIP_NAME_SAFE_RE.sub("_", stem).strip("._-") or f"image_{index:04d}"
+    stem = _sanitize_zip_stem(stem).strip("._-") or f"image_{index:04d}"
     return f"{stem}.webp"
 
 
+@lru_cache(maxsize=4096)
 def _safe_zip_entry_name_with_ext(raw_stem: str, *, index: int, ext: str) -> str:
     stem = (raw_stem or "").strip() or f"image_{index:04d}"
-    stem = _ZIP_NAME_SAFE_RE.sub("_", stem).strip("._-") or f"image_{index:04d}"
+    stem = _sanitize_zip_stem(stem).strip("._-") or f"image_{index:04d}"
     ext = (ext or "").lower().strip()
     if not ext.startswith("."):
         ext = f".{ext}"
@@ -676,6 +1226,325 @@ def _safe_zip_entry_name_with_ext(raw_stem: str, *, index: int, ext: str) -> str
     return f"{stem}{ext}"
 
 
+def _unique_zip_entry_name(name: str, taken: set[str]) -> str:
+    """Return ``name`` (or ``name_N``) so it does not collide with ``taken``.
+
+    Batch outputs are written side by side by parallel workers, so two uploads
+    that sanitize to the same entry name must not share an output path.
+    """
+    stem, dot, ext = name.rpartition(".")
+    candidate = name
+    counter = 1
+    while candidate in taken:
+        counter += 1
+        candidate = f"{stem}_{counter}{dot}{ext}"
+    taken.add(candidate)
+    return candidate
+
+
+def _wait_in_order(futures: list[Future]) -> list:
+    """Return batch results in submit order, cancelling the rest on the first error."""
+    try:
+        return [future.result() for future in futures]
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+
+
+def _submit_bounded(
+    submits: Iterable[Callable[[], Future]], window: int = 2 * BATCH_WORKERS
+) -> Iterator[Future]:
+    """Yield batch futures in submit order with at most ``window`` in flight.
+
+    The next job is only submitted once the caller takes the oldest future, so
+    finished outputs cannot pile up on disk or in memory ahead of the writer.
+    """
+    pending: deque[Future] = deque()
+    for submit in submits:
+        if len(pending) >= window:
+            yield pending.popleft()
+        pending.append(submit())
+    while pending:
+        yield pending.popleft()
+
+
+class _ZipChunkSink(io.RawIOBase):
+    """Write-only, unseekable file object that hands ZipFile output back in chunks."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> list[bytes]:
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+
+def _iter_stored_zip(entries: list[Path | tuple[str, bytes]]):
+    """Yield a STORED ZIP of ``entries`` as it is built.
+
+    An entry is either a file (entry name = file name) or an ``(arcname, data)``
+    pair for outputs that were encoded in memory and never touched the disk.
+    ZipFile falls back to data descriptors on an unseekable sink, so nothing is
+    staged on disk and the first entry ships as soon as it is read. Files are
+    scratch outputs and are deleted once their entry has been written.
+    """
+    sink = _ZipChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as zf:
+        for path in entries:
+            if isinstance(path, tuple):
+                arcname, data = path
+                zf.writestr(zipfile.ZipInfo(arcname, date_time=time.localtime()[:6]), data)
+                yield from sink.drain()
+                continue
+            zinfo = zipfile.ZipInfo.from_file(path, arcname=path.name)
+            force_zip64 = zinfo.file_size > zipfile.ZIP64_LIMIT
+            with open(path, "rb") as src, zf.open(zinfo, "w", force_zip64=force_zip64) as dst:
+                while chunk := src.read(UPLOAD_CHUNK_SIZE):
+                    dst.write(chunk)
+                    yield from sink.drain()
+            path.unlink(missing_ok=True)
+            yield from sink.drain()
+    yield from sink.drain()
+
+
+def _zip_write_file(zf: zipfile.ZipFile, path: Path, arcname: str) -> None:
+    """``zf.write`` with ``UPLOAD_CHUNK_SIZE`` copies instead of 8 KiB ones.
+
+    The size is taken from the file up front, so the local header is sized for
+    ZIP64 only when the entry actually needs it.
+    """
+    zinfo = zipfile.ZipInfo.from_file(path, arcname=arcname)
+    zinfo.compress_type = zf.compression
+    with open(path, "rb", buffering=0) as src, zf.open(zinfo, "w") as dst:
+        if not _zip_sendfile_entry(zf, dst, src, zinfo.file_size):
+            shutil.copyfileobj(src, dst, UPLOAD_CHUNK_SIZE)
+
+
+@contextmanager
+def _preallocated_zip(path: Path, size_hint: int) -> Iterator[zipfile.ZipFile]:
+    """Open a new STORED ZIP at ``path`` with ``size_hint`` bytes reserved.
+
+    Reserving the space up front lets the file system lay the archive out in
+    a few contiguous extents instead of growing it one write at a time. The
+    file is trimmed to the real archive size once it is closed.
+    """
+    with open(path, "wb") as fp:
+        if size_hint > 0 and hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(fp.fileno(), 0, size_hint)
+            except OSError:
+                pass
+        with zipfile.ZipFile(fp, "w", compression=zipfile.ZIP_STORED) as zf:
+            yield zf
+        fp.truncate()
+
+
+def _file_crc32(fd: int, size: int) -> int:
+    """CRC-32 of the first ``size`` bytes of ``fd``, read through an mmap.
+
+    ``zlib.crc32`` is fed 4 MiB views of the mapping, so there is no per-chunk
+    read() copy and zlib's vectorized CRC runs at memory bandwidth.
+    """
+    if size == 0:
+        return 0
+    crc = 0
+    with mmap.mmap(fd, size, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+        for offset in range(0, size, 4 * 1024 * 1024):
+            crc = zlib.crc32(view[offset:offset + 4 * 1024 * 1024], crc)
+    return crc
+
+
+_ZIP_WRITE_COUNTERS = ("_file_size", "_compress_size", "_crc")
+
+
+def _zip_sendfile_entry(zf: zipfile.ZipFile, dst, src, size: int) -> bool:
+    """Copy a STORED entry's payload with ``os.sendfile`` into an on-disk ZIP.
+
+    A stored entry is byte-identical to its source, so the kernel can move the
+    bytes from page cache to the archive; only the CRC is computed here. ``dst``
+    is the handle from ``zf.open(zinfo, "w")``, which rewrites the local header
+    from the counters set below when it closes. Returns False (with nothing
+    written) when the fast path does not apply, so the caller copies instead.
+    """
+    if (
+        zf.compression != zipfile.ZIP_STORED
+        or not hasattr(os, "sendfile")
+        or not getattr(zf, "_seekable", False)
+        or not hasattr(zf.fp, "fileno")
+        # zipfile's private write-handle counters; if a future CPython renames
+        # them, copying through ``dst`` is the safe path.
+        or not all(hasattr(dst, name) for name in _ZIP_WRITE_COUNTERS)
+    ):
+        return False
+    crc = _file_crc32(src.fileno(), size)
+    zf.fp.flush()
+    start = zf.fp.tell()
+    sent = 0
+    try:
+        while sent < size:
+            count = os.sendfile(zf.fp.fileno(), src.fileno(), sent, size - sent)
+            if count == 0:
+                break
+            sent += count
+    except OSError:
+        pass  # e.g. platforms where sendfile only targets sockets
+    if sent != size:
+        # The CRC covers ``size`` bytes: a short copy (the file shrank, or
+        # sendfile failed) must not be recorded as this entry.
+        zf.fp.seek(start)
+        zf.fp.truncate()
+        src.seek(0)
+        return False
+    zf.fp.seek(start + sent)
+    dst._file_size = dst._compress_size = sent
+    dst._crc = crc
+    return True
+
+
+def _drop_page_cache(path: Path) -> None:
+    """Hint the kernel to evict ``path`` from the page cache (best effort).
+
+    Used for archives parked on disk until a later download: they are read
+    once, so keeping them cached only evicts pages other requests need.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _zip_stream_response(
+    entries: list[Path | tuple[str, bytes]], *, download_name: str, cleanup_dir: Path
+) -> Response:
+    """Stream ``entries`` as a ZIP attachment and remove ``cleanup_dir`` afterwards."""
+    response = Response(
+        _iter_stored_zip(entries),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{download_name}"'},
+    )
+    response.call_on_close(lambda: _remove_tree_later(cleanup_dir))
+    return response
+
+
+def _send_output(path: Path, *, mimetype: str, download_name: str) -> Response:
+    """Send a one-shot conversion result as a download.
+
+    Results are deleted once the response is sent, so there is nothing for the
+    client to revalidate and no ETag is computed for them. With a fronting web
+    server configured the file is first moved into HANDOFF_DIR, out of reach of
+    the caller's cleanup, and the proxy sends it from there.
+    """
+    if X_ACCEL_REDIRECT_PREFIX or USE_X_SENDFILE:
+        handoff = HANDOFF_DIR / f"{uuid.uuid4().hex}{path.suffix}"
+        try:
+            os.rename(path, handoff)
+        except OSError:
+            pass  # SCRATCH_DIR on another file system: send it ourselves.
+        else:
+            _cleanup_executor.submit(_sweep_handoff)
+            return _send_via_proxy(handoff, mimetype=mimetype, download_name=download_name)
+    return send_file(
+        path, mimetype=mimetype, as_attachment=True, download_name=download_name, etag=False
+    )
+
+
+_PARKED_ZIP_PREFIXES = ("images_webp_", "batch_webp_", "audio_ogg_")
+
+
+def _park_zip(zip_path: Path, prefix: str) -> str:
+    """Keep a batch archive in OUTPUT_DIR for a later download; return its ID.
+
+    The archive is moved, which is a rename unless SCRATCH_DIR is on another
+    file system, rather than copied next to itself.
+    """
+    zip_id = uuid.uuid4().hex
+    parked = OUTPUT_DIR / f"{prefix}{zip_id}.zip"
+    shutil.move(zip_path, parked)
+    _drop_page_cache(parked)
+    _cleanup_executor.submit(_sweep_parked_zips)
+    return zip_id
+
+
+def _send_via_proxy(path: Path, *, mimetype: str, download_name: str) -> Response:
+    """Let the fronting web server send ``path`` from DATA_DIR as a download."""
+    # werkzeug builds the Content-Disposition (RFC 5987 for non-ASCII names)
+    # and the X-Sendfile header; nginx wants its internal URI instead.
+    response = werkzeug_send_file(
+        path,
+        request.environ,
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=download_name,
+        use_x_sendfile=True,
+        etag=False,
+    )
+    if X_ACCEL_REDIRECT_PREFIX:
+        del response.headers["X-Sendfile"]
+        relative = path.relative_to(DATA_DIR).as_posix()
+        response.headers["X-Accel-Redirect"] = f"{X_ACCEL_REDIRECT_PREFIX}/{relative}"
+    return response
+
+
+def _sweep_handoff() -> None:
+    """Delete outputs handed to the proxy more than PARKED_ZIP_TTL seconds ago."""
+    cutoff = time.time() - PARKED_ZIP_TTL
+    for entry in os.scandir(HANDOFF_DIR):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+        except OSError:
+            pass
+
+
+def _sweep_parked_zips() -> None:
+    """Delete parked archives older than PARKED_ZIP_TTL.
+
+    Covers archives that were never fetched and those handed to the proxy,
+    which cannot be deleted while it may still be sending them.
+    """
+    cutoff = time.time() - PARKED_ZIP_TTL
+    for entry in os.scandir(OUTPUT_DIR):
+        if not (entry.name.startswith(_PARKED_ZIP_PREFIXES) and entry.name.endswith(".zip")):
+            continue
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+        except OSError:
+            pass
+
+
+def _send_parked_zip(zip_path: Path, *, download_name: str) -> Response:
+    """Send a parked archive, through the fronting web server when configured."""
+    if not zip_path.exists():
+        abort(404, "File không tồn tại hoặc đã hết hạn")
+    if X_ACCEL_REDIRECT_PREFIX or USE_X_SENDFILE:
+        return _send_via_proxy(zip_path, mimetype="application/zip", download_name=download_name)
+
+    @after_this_request
+    def cleanup(response):
+        zip_path.unlink(missing_ok=True)
+        return response
+
+    return _send_output(zip_path, mimetype="application/zip", download_name=download_name)
+
+
 def _parse_bool(raw: object | None) -> bool:
     return str(raw).strip().lower() in {"1", "true", "yes", "on"}
 
@@ -698,85 +1567,191 @@ def _convert_image(
 
     if output_path is None:
         output_path = OUTPUT_DIR / f"{uuid.uuid4().hex}.{target}"
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-
-    vf_parts: list[str] = []
-    if width is not None:
-        vf_parts.append(f"scale={width}:-1:flags=lanczos")
-    vf = ",".join(vf_parts) if vf_parts else None
 
-    # If target size is specified and format supports quality adjustment
+    # If target size is specified and format supports quality adjustment,
+    # decode and scale once, then search for the quality in memory.
     if target_size_kb is not None and target in {"webp", "jpg"}:
-        # Try iteratively with decreasing quality
-        best_quality = quality if quality is not None else 90
-        min_quality = 10
-
-        for q in range(best_quality, min_quality - 1, -5):
-            cmd: list[str] = [FFMPEG_PATH, "-y", "-i", str(input_path)]
-            if vf:
-                cmd += ["-vf", vf]
+        with Image.open(input_path) as img:
+            has_alpha = "A" in img.getbands() or "transparency" in img.info
+            frame = img.convert("RGBA" if has_alpha and target == "webp" else "RGB")
+        frame = _resize_frame(frame, _scaled_size(frame.size, width, None))
 
+        def encode(q: int) -> bytes:
+            buffer = io.BytesIO()
             if target == "webp":
-                cmd += [
-                    "-an",
-                    "-c:v",
-                    "libwebp",
-                    "-compression_level",
-                    "6",
-                    "-lossless",
-                    "0",
-                    "-q:v",
-                    str(q),
-                ]
-            else:  # jpg
-                jpeg_q = int(round(31 - (max(1, min(100, q)) - 1) * (29 / 99)))
-                jpeg_q = max(2, min(31, jpeg_q))
-                cmd += ["-an", "-q:v", str(jpeg_q)]
-
-            cmd.append(str(output_path))
-            _run_ffmpeg(cmd)
+                frame.save(buffer, "WEBP", quality=q, method=6)
+            else:
+                frame.save(buffer, "JPEG", quality=q)
+            return buffer.getvalue()
+
+        output_path.write_bytes(
+            _encode_under_size(
+                encode,
+                target_bytes=target_size_kb * 1024,
+                max_quality=quality if quality is not None else 90,
+            )
+        )
+        return output_path
 
-            # Check file size
-            file_size_kb = output_path.stat().st_size / 1024
-            if file_size_kb <= target_size_kb or q <= min_quality:
-                break
+    # Standard conversion without size constraint: decoded and encoded by
+    # Pillow in this process, an ffmpeg start-up costs more than the encode.
+    return _convert_image_in_process(
+        input_path,
+        target=target,
+        width=width,
+        quality=quality,
+        lossless=lossless,
+        output_path=output_path,
+    )
 
-        return output_path
 
-    # Standard conversion without size constraint
-    cmd: list[str] = [FFMPEG_PATH, "-y", "-i", str(input_path)]
-    if vf:
-        cmd += ["-vf", vf]
+def _convert_image_in_process(
+    input_path: Path,
+    *,
+    target: str,
+    width: int | None = None,
+    quality: int | None = None,
+    lossless: bool = False,
+    output_path: Path | None = None,
+) -> Path | bytes:
+    """Decode, resize and encode a static image with Pillow, in this process.
+
+    Does the work of ``_convert_image`` when no target size is set, and backs
+    the batch endpoints directly: Lanczos scaling, WebP method 6, q80 WebP /
+    q85 JPEG by default, with no ffmpeg start-up per file. Without
+    ``output_path`` the encoded bytes are returned, ready for
+    ``_iter_stored_zip``.
+    """
+    with Image.open(input_path) as img:
+        if width is not None and img.width:
+            height = max(1, round(img.height * width / img.width))
+            # Let the JPEG decoder downscale by DCT first when shrinking a lot.
+            img.draft("RGB", (width, height))
+        if target == "jpg":
+            frame = img.convert("RGB")
+        elif img.mode in ("RGB", "RGBA") or (target == "png" and img.mode in ("L", "LA")):
+            frame = img.copy()
+        else:
+            has_alpha = "A" in img.getbands() or "transparency" in img.info
+            frame = img.convert("RGBA" if has_alpha else "RGB")
 
+    if width is not None and frame.width != width:
+        height = max(1, round(frame.height * width / frame.width))
+        frame = _resize_frame(frame, (width, height))
+
+    dst = io.BytesIO() if output_path is None else output_path
     if target == "webp":
-        cmd += [
-            "-an",
-            "-c:v",
-            "libwebp",
-            "-compression_level",
-            "6",
-        ]
         if lossless:
-            cmd += ["-lossless", "1"]
+            frame.save(dst, "WEBP", lossless=True, method=6)
         else:
-            q = 80 if quality is None else quality
-            cmd += ["-lossless", "0", "-q:v", str(q)]
+            frame.save(dst, "WEBP", quality=80 if quality is None else quality, method=6)
     elif target == "png":
-        cmd += ["-an", "-c:v", "png"]
-    else:  # jpg
-        q = 85 if quality is None else quality
-        # ffmpeg's JPEG quality scale is ~2(best)..31(worst). Map 1..100 -> 31..2.
-        jpeg_q = int(round(31 - (max(1, min(100, q)) - 1) * (29 / 99)))
-        jpeg_q = max(2, min(31, jpeg_q))
-        cmd += ["-an", "-q:v", str(jpeg_q)]
+        frame.save(dst, "PNG")
+    else:
+        frame.save(dst, "JPEG", quality=85 if quality is None else quality)
+    return dst.getvalue() if output_path is None else output_path
 
-    cmd.append(str(output_path))
-    _run_ffmpeg(cmd)
-    return output_path
+
+@lru_cache(maxsize=1)
+def _h264_encoder() -> str:
+    """Return the H.264 encoder to use, probing hardware encoders once.
+
+    ``ffmpeg -encoders`` only lists what was compiled in, so each candidate is
+    tried on a tiny synthetic clip to make sure the device is really there.
+    """
+    if VIDEO_ENCODER in H264_ENCODER_ARGS:
+        return VIDEO_ENCODER
+    for encoder in ("h264_nvenc", "h264_qsv", "h264_videotoolbox"):
+        probe = [
+            FFMPEG_PATH, "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", "color=c=black:s=256x256:d=0.1",
+            "-c:v", encoder, *H264_ENCODER_ARGS[encoder],
+            "-f", "null", "-",
+        ]
+        try:
+            result = subprocess.run(
+                probe, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=15
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            continue
+        if result.returncode == 0:
+            return encoder
+    return "libx264"
 
 
 def _convert_video(
     input_path: Path, fps: int, duration: int | None = None, loop: bool = False
+) -> Path:
+    encoder = _h264_encoder()
+    try:
+        return _encode_h264(input_path, fps, duration=duration, loop=loop, encoder=encoder)
+    except RuntimeError:
+        if encoder == "libx264":
+            raise
+        # Hardware sessions can be exhausted or refuse a source; redo it on the CPU.
+        return _encode_h264(input_path, fps, duration=duration, loop=loop, encoder="libx264")
+
+
+def _stream_fragmented_preview(input_path: Path, fps: int, duration: int | None):
+    """Yield a fragmented MP4 preview while ffmpeg is still encoding it.
+
+    The output is constrained-baseline H.264 without audio so it matches the
+    ``avc1.42E01E`` SourceBuffer the player opens; one keyframe per second
+    gives one fragment per second of video.
+    """
+    cmd = [FFMPEG_PATH, "-hide_banner", "-loglevel", "error", "-i", str(input_path)]
+    if duration:
+        cmd += ["-t", str(duration)]
+    cmd += [
+        "-filter:v",
+        f"fps={fps}",
+        "-an",
+        "-c:v",
+        "libx264",
+        "-preset",
+        "ultrafast",
+        "-profile:v",
+        "baseline",
+        "-level",
+        "3.0",
+        "-pix_fmt",
+        "yuv420p",
+        "-g",
+        str(fps),
+        "-movflags",
+        "frag_keyframe+empty_moov+default_base_moof",
+        "-f",
+        "mp4",
+        "pipe:1",
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    # Drained on the side so a chatty failure can never block the encode.
+    tail: deque[bytes] = deque(maxlen=50)
+    drain = threading.Thread(target=tail.extend, args=(proc.stderr,), daemon=True)
+    drain.start()
+    finished = False
+    try:
+        while chunk := proc.stdout.read1(64 * 1024):
+            yield chunk
+        finished = True
+    finally:
+        # Client moved the slider again (or disconnected): stop encoding.
+        if not finished and proc.poll() is None:
+            proc.kill()
+        proc.stdout.close()
+        proc.wait()
+        drain.join()
+        proc.stderr.close()
+    if proc.returncode != 0:
+        # The status line is already sent; failing the generator makes the
+        # server drop the connection instead of ending a short 200 cleanly.
+        message = b"".join(tail).decode("utf-8", errors="ignore").strip()
+        print(f"Preview encode failed (ffmpeg exit {proc.returncode}): {message}")
+        raise RuntimeError(message)
+
+
+def _encode_h264(
+    input_path: Path, fps: int, *, duration: int | None, loop: bool, encoder: str
 ) -> Path:
     output_path = OUTPUT_DIR / f"{uuid.uuid4().hex}.mp4"
     cmd = [FFMPEG_PATH, "-y"]
@@ -792,25 +1767,76 @@ def _convert_video(
         "-filter:v",
         f"fps={fps}",
         "-c:v",
-        "libx264",
-        "-preset",
-        "ultrafast",
-        "-crf",
-        "23",
+        encoder,
+        *H264_ENCODER_ARGS[encoder],
         "-c:a",
         "copy",
         str(output_path),
     ]
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    if result.returncode != 0:
-        raise RuntimeError(result.stderr.decode("utf-8", errors="ignore"))
+    try:
+        # Long encodes: use every core (batch workers keep their share).
+        _run_ffmpeg(cmd, threads=os.cpu_count())
+    except RuntimeError:
+        output_path.unlink(missing_ok=True)
+        raise
     return output_path
 
 
-def _run_ffmpeg(cmd: list[str]) -> None:
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    if result.returncode != 0:
-        raise RuntimeError(result.stderr.decode("utf-8", errors="ignore"))
+def _run_ffmpeg(
+    cmd: list[str], stdin_chunks: Iterable[bytes] | None = None, *, threads: int | None = None
+) -> None:
+    """Run ffmpeg, raising RuntimeError with the end of its log on failure.
+
+    ``stdin_chunks``, when given, is written to ffmpeg's stdin (``-i -``) from
+    a helper thread while this one drains the log. ``threads`` sets the thread
+    count when called from a request thread; batch workers always use their
+    FFMPEG_BATCH_THREADS share instead.
+    """
+    threads = getattr(_worker_state, "ffmpeg_threads", None) or threads
+    if threads is not None:
+        # Before the first input it caps that decoder and the filter graph;
+        # before the (last) output path it caps the encoder as well.
+        cmd = [
+            cmd[0], "-threads", str(threads), "-filter_threads", str(threads),
+            *cmd[1:-1], "-threads", str(threads), cmd[-1],
+        ]
+    # Without the progress line ffmpeg's log is a few lines per run; only its
+    # tail is kept for the error, so a chatty encode never piles up in memory.
+    proc = subprocess.Popen(
+        [cmd[0], "-nostats", *cmd[1:]],
+        stdin=subprocess.PIPE if stdin_chunks is not None else None,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    feeder: threading.Thread | None = None
+    if stdin_chunks is not None:
+        feed_errors: list[BaseException] = []
+
+        def feed() -> None:
+            try:
+                for chunk in stdin_chunks:
+                    proc.stdin.write(chunk)
+            except BrokenPipeError:
+                pass  # ffmpeg gave up early; its log says why
+            except BaseException as exc:
+                feed_errors.append(exc)
+            finally:
+                # Always send EOF, or ffmpeg waits on its input forever.
+                try:
+                    proc.stdin.close()
+                except BrokenPipeError:
+                    pass
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+    with proc:
+        tail = deque(proc.stderr, maxlen=200)
+        if feeder is not None:
+            feeder.join()
+            if feed_errors:
+                raise feed_errors[0]
+    if proc.returncode != 0:
+        raise RuntimeError(b"".join(tail).decode("utf-8", errors="ignore"))
 
 
 def _convert_image_to_webp(
@@ -821,24 +1847,23 @@ def _convert_image_to_webp(
 ) -> Path:
     if output_path is None:
         output_path = OUTPUT_DIR / f"{uuid.uuid4().hex}.webp"
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    cmd = [
-        FFMPEG_PATH,
-        "-y",
-        "-i",
-        str(input_path),
-        "-c:v",
-        "libwebp",
-        "-compression_level",
-        "6",
-    ]
-    if lossless:
-        cmd += ["-lossless", "1"]
-    else:
-        cmd += ["-lossless", "0", "-q:v", "80"]
-    cmd.append(str(output_path))
-    _run_ffmpeg(cmd)
-    return output_path
+    # Static images are encoded by Pillow's libwebp in this process; an ffmpeg
+    # start-up costs more than the whole encode for typical PNG/JPG inputs.
+    return _convert_image_in_process(
+        input_path, target="webp", lossless=lossless, output_path=output_path
+    )
+
+
+def _fit_frame_rgba(frame_path: Path, size: tuple[int, int]) -> bytes:
+    """Decode one frame and center it, aspect kept, on a transparent canvas."""
+    with Image.open(frame_path) as img:
+        img = img.convert("RGBA")
+    if img.size != size:
+        img = ImageOps.contain(img, size, method=Image.Resampling.LANCZOS)
+        canvas = Image.new("RGBA", size, (0, 0, 0, 0))
+        canvas.paste(img, ((size[0] - img.width) // 2, (size[1] - img.height) // 2))
+        img = canvas
+    return img.tobytes()
 
 
 def _convert_images_to_animated_webp(
@@ -851,36 +1876,51 @@ def _convert_images_to_animated_webp(
     if not frame_paths:
         abort(400, "Thiếu ảnh")
 
-    # Keep list file next to frames so rmtree() cleans everything.
-    list_path = frame_paths[0].parent / f"{uuid.uuid4().hex}_frames.txt"
     output_path = OUTPUT_DIR / f"{uuid.uuid4().hex}.webp"
-    frame_duration = 1.0 / float(fps)
-
-    # Concat demuxer: add final file again (without duration) so the last frame is held.
-    lines: list[str] = []
-    for frame in frame_paths:
-        lines.append(f"file '{frame.as_posix()}'")
-        lines.append(f"duration {frame_duration:.6f}")
-    if frame_paths:
-        lines.append(f"file '{frame_paths[-1].as_posix()}'")
-
-    list_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
 
     vf_parts: list[str] = []
     if width is not None:
         vf_parts.append(f"scale={width}:-1:flags=lanczos")
-    vf_parts.append("format=rgba")
+    # Keep alpha in bgra, which libwebp takes as is; rgba would need one more
+    # conversion pass per frame in front of the encoder.
+    vf_parts.append("format=bgra")
     vf = ",".join(vf_parts)
 
+    headers: set[tuple[str | None, tuple[int, int]]] = set()
+    for frame in frame_paths:
+        with Image.open(frame) as img:  # header only; pixels are not decoded
+            headers.add((img.format, img.size))
+
+    stdin_chunks: Iterable[bytes]
+    if len(headers) == 1:
+        # Same format and size throughout: the files are piped back to back and
+        # ffmpeg splits the stream at image boundaries.
+        input_args = ["-f", "image2pipe", "-framerate", str(fps), "-i", "-"]
+        stdin_chunks = (frame.read_bytes() for frame in frame_paths)
+    else:
+        # image2pipe keeps the first frame's decoder and size, so a JPG after a
+        # PNG (or a differently sized PNG) would be dropped. Decode here instead
+        # and fit every frame onto the first one's canvas as raw RGBA.
+        with Image.open(frame_paths[0]) as first:
+            canvas_size = first.size
+        input_args = [
+            "-f",
+            "rawvideo",
+            "-pix_fmt",
+            "rgba",
+            "-s",
+            f"{canvas_size[0]}x{canvas_size[1]}",
+            "-framerate",
+            str(fps),
+            "-i",
+            "-",
+        ]
+        stdin_chunks = (_fit_frame_rgba(frame, canvas_size) for frame in frame_paths)
+
     cmd = [
         FFMPEG_PATH,
         "-y",
-        "-f",
-        "concat",
-        "-safe",
-        "0",
-        "-i",
-        str(list_path),
+        *input_args,
         "-vsync",
         "vfr",
         "-vf",
@@ -898,10 +1938,7 @@ def _convert_images_to_animated_webp(
         "6",
         str(output_path),
     ]
-    try:
-        _run_ffmpeg(cmd)
-    finally:
-        list_path.unlink(missing_ok=True)
+    _run_ffmpeg(cmd, stdin_chunks=stdin_chunks)
     return output_path
 
 
@@ -916,12 +1953,13 @@ def _convert_video_to_animated_webp(
 ) -> Path:
     if output_path is None:
         output_path = OUTPUT_DIR / f"{uuid.uuid4().hex}.webp"
-    output_path.parent.mkdir(parents=True, exist_ok=True)
 
     vf_parts: list[str] = [f"fps={fps}"]
     if width is not None:
         vf_parts.append(f"scale={width}:-1:flags=lanczos")
-    vf_parts.append("format=rgba")
+    # Keep alpha in bgra, which libwebp takes as is; rgba would need one more
+    # conversion pass per frame in front of the encoder.
+    vf_parts.append("format=bgra")
     vf = ",".join(vf_parts)
 
     cmd: list[str] = [FFMPEG_PATH, "-y", "-i", str(input_path)]
@@ -945,7 +1983,101 @@ def _convert_video_to_animated_webp(
         "0",
         str(output_path),
     ]
-    _run_ffmpeg(cmd)
+    # libwebp encodes on one thread whatever -threads says, but decoding the
+    # video and scaling it use every core the encode can have.
+    _run_ffmpeg(cmd, threads=os.cpu_count())
+    return output_path
+
+
+def _scaled_size(size: tuple[int, int], width: int | None, height: int | None) -> tuple[int, int]:
+    """Target size for ffmpeg-style ``scale=W:-1`` / ``scale=-1:H`` / ``scale=W:H``."""
+    src_w, src_h = size
+    if width is not None and height is not None:
+        return width, height
+    if width is not None:
+        return width, max(1, round(src_h * width / src_w))
+    if height is not None:
+        return max(1, round(src_w * height / src_h)), height
+    return src_w, src_h
+
+
+def _resize_frame(frame: Image.Image, size: tuple[int, int]) -> Image.Image:
+    """Resize ``frame``; downscales use OpenCV's INTER_AREA when it is installed."""
+    if HAS_CV2 and frame.mode in ("L", "RGB", "RGBA") and size[0] < frame.width and size[1] < frame.height:
+        return Image.fromarray(cv2.resize(np.asarray(frame), size, interpolation=cv2.INTER_AREA))
+    return frame.resize(size, Image.Resampling.LANCZOS)
+
+
+def _encode_under_size(encode, *, target_bytes: int, max_quality: int, min_quality: int = 10) -> bytes:
+    """Return ``encode(q)`` for the highest quality that fits in ``target_bytes``.
+
+    ``max_quality`` is tried first, since targets are often loose enough that
+    it already fits; otherwise ``[min_quality, max_quality)`` is bisected, so a
+    search takes at most ~8 encodes. If nothing fits, the ``min_quality``
+    encoding is returned.
+    """
+    lo, hi = min_quality, max(min_quality, max_quality)
+    data = encode(hi)
+    if len(data) <= target_bytes:
+        return data
+    best: bytes | None = None
+    smallest: bytes | None = data if hi == min_quality else None
+    hi -= 1
+    while lo <= hi:
+        q = (lo + hi) // 2
+        data = encode(q)
+        if len(data) <= target_bytes:
+            best = data
+            lo = q + 1
+        else:
+            if q == min_quality:
+                smallest = data
+            hi = q - 1
+    return best if best is not None else smallest
+
+
+def _resize_animated_webp_on_disk(
+    img: Image.Image, size: tuple[int, int], *, output_path: Path, target_bytes: int, max_quality: int
+) -> Path:
+    """Target-size search for animations too big to keep decoded in memory.
+
+    Each frame is decoded and scaled once into a PNG next to the output, then
+    every quality try has ffmpeg encode those from a concat list that keeps
+    the frame durations. Only one decoded frame is ever held here. (ffmpeg
+    cannot decode animated WebP itself, so it cannot read the source.)
+    """
+    frames_dir = output_path.with_name(f"{output_path.stem}_frames")
+    frames_dir.mkdir()
+    try:
+        # Each PNG is read at a 1 ms time base ("option framerate"), so frame
+        # durations are not rounded to the image demuxer's default 40 ms.
+        lines: list[str] = []
+        for index, frame in enumerate(ImageSequence.Iterator(img)):
+            name = f"{index:05d}.png"
+            _resize_frame(frame.convert("RGBA"), size).save(frames_dir / name, compress_level=1)
+            lines += [f"file '{name}'", "option framerate 1000"]
+            lines.append(f"duration {frame.info.get('duration', 100) / 1000:.3f}")
+        # Listed again (without duration) so the last frame is held.
+        lines += lines[-3:-1]
+        list_path = frames_dir / "frames.txt"
+        list_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+        attempt = frames_dir / "attempt.webp"
+
+        def encode(q: int) -> bytes:
+            _run_ffmpeg([
+                FFMPEG_PATH, "-y", "-f", "concat", "-safe", "0", "-i", str(list_path),
+                "-vf", "format=bgra", "-an", "-vsync", "0",
+                "-c:v", "libwebp", "-preset", "default", "-q:v", str(q),
+                "-compression_level", "6", "-loop", "0", str(attempt),
+            ])
+            return attempt.read_bytes()
+
+        output_path.write_bytes(
+            _encode_under_size(encode, target_bytes=target_bytes, max_quality=max_quality)
+        )
+    finally:
+        shutil.rmtree(frames_dir, ignore_errors=True)
     return output_path
 
 
@@ -965,7 +2097,6 @@ def _resize_animated_media(
 
     if output_path is None:
         output_path = OUTPUT_DIR / f"{uuid.uuid4().hex}{suffix}"
-    output_path.parent.mkdir(parents=True, exist_ok=True)
 
     # Build scale filter
     vf_parts: list[str] = []
@@ -976,42 +2107,46 @@ def _resize_animated_media(
     elif height is not None:
         vf_parts.append(f"scale=-1:{height}:flags=lanczos")
 
-    # If target size is specified, try iteratively
-    if target_size_kb is not None and suffix == ".webp":
-        best_quality = quality if quality is not None else 90
-        min_quality = 10
-
-        for q in range(best_quality, min_quality - 1, -5):
-            cmd: list[str] = [FFMPEG_PATH, "-y", "-i", str(input_path)]
-
-            if vf_parts:
-                vf_parts_copy = vf_parts.copy()
-                vf_parts_copy.append("format=rgba")
-                cmd += ["-vf", ",".join(vf_parts_copy)]
-            else:
-                cmd += ["-vf", "format=rgba"]
-
-            cmd += [
-                "-an",
-                "-c:v",
-                "libwebp",
-                "-preset",
-                "default",
-                "-q:v",
-                str(q),
-                "-compression_level",
-                "6",
-                "-loop",
-                "0",
-                str(output_path),
-            ]
-            _run_ffmpeg(cmd)
-
-            # Check file size
-            file_size_kb = output_path.stat().st_size / 1024
-            if file_size_kb <= target_size_kb or q <= min_quality:
-                break
+    # If target size is specified, decode and scale the frames once, then
+    # search for the quality in memory instead of re-running ffmpeg per try.
+    if target_size_kb is not None and suffix == ".webp":
+        with Image.open(input_path) as img:
+            size = _scaled_size(img.size, width, height)
+            if getattr(img, "n_frames", 1) * size[0] * size[1] * 4 > ANIMATED_SEARCH_MAX_BYTES:
+                return _resize_animated_webp_on_disk(
+                    img,
+                    size,
+                    output_path=output_path,
+                    target_bytes=target_size_kb * 1024,
+                    max_quality=quality if quality is not None else 90,
+                )
+            frames: list[Image.Image] = []
+            durations: list[int] = []
+            for frame in ImageSequence.Iterator(img):
+                frames.append(_resize_frame(frame.convert("RGBA"), size))
+                durations.append(frame.info.get("duration", 100))
+
+        def encode(q: int) -> bytes:
+            buffer = io.BytesIO()
+            frames[0].save(
+                buffer,
+                "WEBP",
+                save_all=True,
+                append_images=frames[1:],
+                duration=durations,
+                loop=0,
+                quality=q,
+                method=6,
+            )
+            return buffer.getvalue()
 
+        output_path.write_bytes(
+            _encode_under_size(
+                encode,
+                target_bytes=target_size_kb * 1024,
+                max_quality=quality if quality is not None else 90,
+            )
+        )
         return output_path
 
     # Standard conversion without size constraint
@@ -1019,10 +2154,10 @@ def _resize_animated_media(
 
     if vf_parts:
         if suffix == ".webp":
-            vf_parts.append("format=rgba")
+            vf_parts.append("format=bgra")  # libwebp's native alpha format
         cmd += ["-vf", ",".join(vf_parts)]
     elif suffix == ".webp":
-        cmd += ["-vf", "format=rgba"]
+        cmd += ["-vf", "format=bgra"]
 
     if suffix == ".webp":
         q = 80 if quality is None else quality
@@ -1048,7 +2183,22 @@ def _resize_animated_media(
 
 
 def _allowed_tgs_suffix(filename: str) -> bool:
-    return Path(filename).suffix.lower() == ".tgs"
+    return _suffix_lower(filename) == ".tgs"
+
+
+@lru_cache(maxsize=1)
+def _tgs_render_pool() -> ProcessPoolExecutor:
+    """Worker processes for Lottie rendering.
+
+    The lottie renderer is pure Python and holds the GIL for the whole export,
+    so batch TGS conversions only run in parallel across processes. Workers
+    are not forked from this process: it already runs the batch, cleanup and
+    log-flusher threads, and a fork could inherit one of their locks held.
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(
+        max_workers=BATCH_WORKERS, mp_context=multiprocessing.get_context(method)
+    )
 
 
 def _convert_tgs_to_gif(
@@ -1069,26 +2219,32 @@ def _convert_tgs_to_gif(
 
     if output_path is None:
         output_path = OUTPUT_DIR / f"{uuid.uuid4().hex}.gif"
-    output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    # TGS files are gzipped Lottie JSON
     try:
-        with gzip.open(input_path, 'rb') as f:
-            lottie_data = json.load(f)
+        return _render_tgs_to_gif(
+            input_path, width=width, quality=quality, fps=fps, output_path=output_path
+        )
+    except RuntimeError as e:
+        abort(500, f"Lỗi chuyển đổi TGS sang GIF: {str(e)}")
 
-        # Parse Lottie animation
-        animation = objects.Animation.load(lottie_data)
 
-        # Map width to renderer DPI (96 is the base scale).
-        dpi = 96
-        if width:
-            scale = width / animation.width if animation.width else 1
-            dpi = max(1, int(round(96 * scale)))
+def _render_tgs_to_gif(
+    input_path: Path,
+    *,
+    width: int | None,
+    quality: int | None,
+    fps: int,
+    output_path: Path,
+) -> Path:
+    """Render a TGS file to GIF, raising ``RuntimeError`` on failure.
 
-        # Map requested fps to skip_frames (renderer uses original frame rate).
-        skip_frames = 1
-        if fps and animation.frame_rate:
-            skip_frames = max(1, int(round(animation.frame_rate / fps)))
+    Runs in the TGS worker processes, so it must not touch the request context.
+    """
+    # TGS files are gzipped Lottie JSON
+    try:
+        # Parse Lottie animation
+        animation = objects.Animation.load(_load_tgs_json(input_path))
+        dpi, skip_frames = _tgs_render_scale(animation, width=width, fps=fps)
 
         # Export to GIF
         export_gif(
@@ -1101,7 +2257,72 @@ def _convert_tgs_to_gif(
         return output_path
 
     except Exception as e:
-        abort(500, f"Lỗi chuyển đổi TGS sang GIF: {str(e)}")
+        # Lottie/PIL exceptions are not always picklable across processes.
+        raise RuntimeError(str(e)) from None
+
+
+def _load_tgs_json(input_path: Path) -> dict:
+    """Decompress and parse a TGS file in one shot (stickers are well under 1 MB)."""
+    raw = gzip.decompress(input_path.read_bytes())
+    return orjson.loads(raw) if HAS_ORJSON else json.loads(raw)
+
+
+def _tgs_render_scale(animation, *, width: int | None, fps: int) -> tuple[int, int]:
+    """Return ``(dpi, skip_frames)`` for rendering ``animation``."""
+    # Map width to renderer DPI (96 is the base scale).
+    dpi = 96
+    if width:
+        scale = width / animation.width if animation.width else 1
+        dpi = max(1, int(round(96 * scale)))
+
+    # Map requested fps to skip_frames (renderer uses original frame rate).
+    skip_frames = 1
+    if fps and animation.frame_rate:
+        skip_frames = max(1, int(round(animation.frame_rate / fps)))
+    return dpi, skip_frames
+
+
+def _render_tgs_to_webp(
+    input_path: Path,
+    *,
+    width: int | None,
+    quality: int | None,
+    fps: int,
+    output_path: Path,
+) -> Path:
+    """Render a TGS file straight to animated WebP, raising ``RuntimeError`` on failure.
+
+    Frames are rasterized with lottie's cairo exporter and encoded by Pillow in
+    one pass, with full alpha and no GIF palette quantization in between.
+    """
+    try:
+        animation = objects.Animation.load(_load_tgs_json(input_path))
+        dpi, skip_frames = _tgs_render_scale(animation, width=width, fps=fps)
+
+        frames: list[Image.Image] = []
+        for frame in range(int(animation.in_point), int(animation.out_point), skip_frames):
+            png = io.BytesIO()
+            lottie_export_png(animation, png, frame, dpi)
+            png.seek(0)
+            frames.append(Image.open(png).convert("RGBA"))
+        if not frames:
+            raise RuntimeError("TGS không có khung hình")
+
+        frame_rate = animation.frame_rate or fps
+        frames[0].save(
+            output_path,
+            "WEBP",
+            save_all=True,
+            append_images=frames[1:],
+            duration=max(1, round(1000 * skip_frames / frame_rate)),
+            loop=0,
+            quality=80 if quality is None else quality,
+            method=4,
+        )
+        return output_path
+
+    except Exception as e:
+        raise RuntimeError(str(e)) from None
 
 
 def _convert_webm_to_gif(
@@ -1113,22 +2334,58 @@ def _convert_webm_to_gif(
 ) -> Path:
     if output_path is None:
         output_path = OUTPUT_DIR / f"{uuid.uuid4().hex}.gif"
-    output_path.parent.mkdir(parents=True, exist_ok=True)
 
     # Palette generation for better quality
     # filters: fps -> scale -> split to generate palette -> paletteuse
-    vf = f"fps={fps},scale={width}:-1:flags=lanczos,split[s0][s1];[s0]palettegen[p];[s1][p]paletteuse"
+    frames = f"fps={fps},scale={width}:-1:flags=lanczos"
+    if CONVERSION_CACHE_BYTES <= 0:
+        vf = f"{frames},split[s0][s1];[s0]palettegen[p];[s1][p]paletteuse"
+        _run_ffmpeg([FFMPEG_PATH, "-y", "-i", str(input_path), "-vf", vf, str(output_path)])
+        return output_path
 
-    cmd = [
-        FFMPEG_PATH,
-        "-y",
-        "-i",
-        str(input_path),
-        "-vf",
-        vf,
-        str(output_path),
-    ]
-    _run_ffmpeg(cmd)
+    # The palette only depends on the frames, so it is cached by input content,
+    # fps and width: converting the same clip again skips the histogram pass.
+    with open(input_path, "rb") as src:
+        digest = hashlib.file_digest(src, "sha256")
+    digest.update(f"palette:{fps}:{width}".encode())
+    palette_path = CACHE_DIR / f"{digest.hexdigest()}.png"
+    # Taken as our own link first: a cache trim could unlink the entry between
+    # an exists() check and ffmpeg opening it.
+    hit_palette = output_path.with_name(f"{output_path.stem}_cached_palette.png")
+    try:
+        _link_or_copy(palette_path, hit_palette)
+    except FileNotFoundError:
+        pass
+    else:
+        try:
+            os.utime(palette_path)  # mtime orders eviction
+        except OSError:
+            pass  # trimmed since; our link still has the data
+        lavfi = f"[0:v]{frames}[x];[x][1:v]paletteuse"
+        try:
+            _run_ffmpeg([
+                FFMPEG_PATH, "-y", "-i", str(input_path), "-i", str(hit_palette),
+                "-lavfi", lavfi, str(output_path),
+            ])
+        finally:
+            hit_palette.unlink(missing_ok=True)
+        return output_path
+
+    # Miss: one run writes both the GIF and the palette it used.
+    new_palette = output_path.with_name(f"{output_path.stem}_palette.png")
+    lavfi = f"[0:v]{frames},split[s0][s1];[s0]palettegen,split[p0][p1];[s1][p0]paletteuse[gif]"
+    _run_ffmpeg([
+        FFMPEG_PATH, "-y", "-i", str(input_path), "-filter_complex", lavfi,
+        "-map", "[gif]", str(output_path),
+        "-map", "[p1]", "-update", "1", str(new_palette),
+    ])
+    try:
+        _link_or_copy(new_palette, palette_path)
+    except OSError:
+        pass  # another request stored it first
+    else:
+        _cleanup_executor.submit(_trim_conversion_cache)
+    new_palette.unlink(missing_ok=True)
     return output_path
 
 
@@ -1146,7 +2403,6 @@ def _convert_json_to_tgs(
 
     if output_path is None:
         output_path = OUTPUT_DIR / f"{uuid.uuid4().hex}.tgs"
-    output_path.parent.mkdir(parents=True, exist_ok=True)
 
     try:
         # Read JSON file
@@ -1186,12 +2442,11 @@ def _convert_gif_to_tgs(
 
     if output_path is None:
         output_path = OUTPUT_DIR / f"{uuid.uuid4().hex}.tgs"
-    output_path.parent.mkdir(parents=True, exist_ok=True)
 
     try:
         # For now, we'll create a simple frame-based Lottie animation
         # Extract frames using ffmpeg
-        frames_dir = OUTPUT_DIR / f"frames_{uuid.uuid4().hex}"
+        frames_dir = SCRATCH_DIR / f"frames_{_scratch_id()}"
         frames_dir.mkdir(parents=True, exist_ok=True)
 
         try:
@@ -1279,7 +2534,37 @@ def upload():
     suffix = Path(file.filename).suffix or ".mp4"
     file_id = f"{uuid.uuid4().hex}{suffix}"
     save_path = UPLOAD_DIR / file_id
-    file.save(save_path)
+    _save_upload(file, save_path)
+
+    return jsonify(
+        {
+            "file_id": file_id,
+            "file_url": f"/files/uploads/{file_id}",
+            "original_fps": None,
+        }
+    )
+
+
+@app.post("/upload-stream")
+def upload_stream():
+    """Store a video sent as the raw request body instead of multipart form data.
+
+    The original filename travels URL-encoded in the ``X-Original-Name`` header.
+    The body is written to disk in chunks as it arrives, so large uploads are
+    never spooled as a form part first.
+    """
+    original_name = unquote(request.headers.get("X-Original-Name", ""))
+    suffix = Path(original_name).suffix
+    if not _UPLOAD_SUFFIX_RE.fullmatch(suffix):
+        suffix = ".mp4"
+    file_id = f"{uuid.uuid4().hex}{suffix}"
+    save_path = UPLOAD_DIR / file_id
+
+    with open(save_path, "wb") as dst:
+        shutil.copyfileobj(request.stream, dst, UPLOAD_CHUNK_SIZE)
+    if save_path.stat().st_size == 0:
+        save_path.unlink(missing_ok=True)
+        abort(400, "Thiếu file video")
 
     return jsonify(
         {
@@ -1298,10 +2583,26 @@ def convert():
     if not file_id:
         abort(400, "Thiếu file_id")
 
+    # Previews only need the first few seconds; encoding just that clip keeps
+    # slider-driven re-conversions cheap regardless of the upload's length.
+    preview_duration: int | None = None
+    preview_raw = payload.get("preview_duration")
+    if preview_raw not in (None, "", 0, "0"):
+        preview_duration = _validate_positive_int(
+            preview_raw, name="preview_duration", min_value=1, max_value=MAX_PREVIEW_DURATION
+        )
+
     input_path = _safe_upload_path(file_id, UPLOAD_DIR)
 
+    if payload.get("stream"):
+        return Response(
+            _stream_fragmented_preview(input_path, fps, preview_duration),
+            mimetype="video/mp4",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
     try:
-        output_path = _convert_video(input_path, fps)
+        output_path = _convert_video(input_path, fps, duration=preview_duration)
     except Exception as exc:  # pragma: no cover - logs forwarded to client
         abort(500, f"Lỗi ffmpeg: {exc}")
 
@@ -1340,10 +2641,9 @@ def export():
             pass
         return response
 
-    return send_file(
+    return _send_output(
         output_path,
         mimetype="video/mp4",
-        as_attachment=True,
         download_name=f"export_{fps}fps_{duration}s.mp4",
     )
 
@@ -1351,6 +2651,16 @@ def export():
 @app.get("/files/uploads/<path:filename>")
 def serve_upload(filename: str):
     file_path = _safe_upload_path(filename, UPLOAD_DIR)
+    if X_ACCEL_REDIRECT_PREFIX:
+        relative = file_path.relative_to(DATA_DIR).as_posix()
+        return Response(
+            mimetype="video/mp4",
+            headers={"X-Accel-Redirect": f"{X_ACCEL_REDIRECT_PREFIX}/{relative}"},
+        )
+    if USE_X_SENDFILE:
+        return werkzeug_send_file(
+            file_path, request.environ, mimetype="video/mp4", use_x_sendfile=True
+        )
     return send_file(file_path, mimetype="video/mp4")
 
 
@@ -1366,18 +2676,8 @@ def timber_log():
     if not log_message:
         return jsonify({"status": "error", "message": "missing log field"}), 400
 
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    try:
-        conn = get_db_connection()
-        conn.execute(
-            'INSERT INTO logs (timestamp, event_name, device_name, version_code, params) VALUES (?, ?, ?, ?, ?)',
-            (timestamp, "timber", "RemoteDebug", "", json.dumps({"message": log_message}))
-        )
-        conn.commit()
-        conn.close()
-        return jsonify({"status": "logged"})
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
+    enqueue_log("timber", "RemoteDebug", "", json.dumps({"message": log_message}))
+    return jsonify({"status": "logged"})
 
 
 @app.route("/api/android-log", methods=["GET", "POST", "DELETE"])
@@ -1385,41 +2685,28 @@ def android_log():
     if request.method == "POST":
         data = request.get_json(silent=True) or {}
         
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         event_name = data.get("eventName", "Unknown")
         device_name = data.get("deviceName", "Unknown Device")
         version_code = str(data.get("versionCode", ""))
         params_json = json.dumps(data.get("params", {}))
 
-        try:
-            conn = get_db_connection()
-            conn.execute(
-                'INSERT INTO logs (timestamp, event_name, device_name, version_code, params) VALUES (?, ?, ?, ?, ?)',
-                (timestamp, event_name, device_name, version_code, params_json)
-            )
-            conn.commit()
-            conn.close()
-            
-            # Return the entry for client confirmation (optional, simplified)
-            return jsonify({
-                "status": "logged", 
-                "entry": {
-                    "timestamp": timestamp,
-                    "eventName": event_name,
-                    "deviceName": device_name,
-                    "versionCode": version_code,
-                    "params": data.get("params", {})
-                }
-            })
-        except Exception as e:
-            return jsonify({"status": "error", "message": str(e)}), 500
+        timestamp = enqueue_log(event_name, device_name, version_code, params_json)
+
+        # Return the entry for client confirmation (optional, simplified)
+        return jsonify({
+            "status": "logged", 
+            "entry": {
+                "timestamp": timestamp,
+                "eventName": event_name,
+                "deviceName": device_name,
+                "versionCode": version_code,
+                "params": data.get("params", {})
+            }
+        })
 
     elif request.method == "DELETE":
         try:
-            conn = get_db_connection()
-            conn.execute('DELETE FROM logs')
-            conn.commit()
-            conn.close()
+            clear_logs()
             return jsonify({"status": "cleared"})
         except Exception as e:
              return jsonify({"status": "error", "message": str(e)}), 500
@@ -1427,10 +2714,9 @@ def android_log():
     else:
         # GET
         try:
-            conn = get_db_connection()
-            # Get last 1000 logs
-            logs_db = conn.execute('SELECT * FROM logs ORDER BY id DESC LIMIT 1000').fetchall()
-            conn.close()
+            with db_reader() as conn:
+                # Get last 1000 logs
+                logs_db = conn.execute('SELECT * FROM logs ORDER BY id DESC LIMIT 1000').fetchall()
             
             logs = []
             for row in logs_db:
@@ -1473,13 +2759,12 @@ def android_log_stream():
         last_id = 0
         while True:
             try:
-                conn = get_db_connection()
-                # Get logs newer than last_id
-                logs_db = conn.execute(
-                    'SELECT * FROM logs WHERE id > ? ORDER BY id ASC LIMIT 50',
-                    (last_id,)
-                ).fetchall()
-                conn.close()
+                with db_reader() as conn:
+                    # Get logs newer than last_id
+                    logs_db = conn.execute(
+                        'SELECT * FROM logs WHERE id > ? ORDER BY id ASC LIMIT 50',
+                        (last_id,)
+                    ).fetchall()
                 
                 if logs_db:
                     for row in logs_db:
@@ -1518,7 +2803,7 @@ def android_log_stream():
 @app.post("/png-to-webp")
 def png_to_webp():
     """Convert an uploaded PNG/JPG image to WebP and return the converted file."""
-    file = request.files.get("file")
+    file = _single_upload()
     if file is None or file.filename == "":
         abort(400, "Thiếu file ảnh")
 
@@ -1529,7 +2814,7 @@ def png_to_webp():
 
     input_name = f"{uuid.uuid4().hex}{suffix}"
     input_path = UPLOAD_DIR / input_name
-    file.save(input_path)
+    _save_upload(file, input_path)
 
     try:
         output_path = _convert_image_to_webp(input_path, lossless=(suffix == ".png"))
@@ -1542,10 +2827,9 @@ def png_to_webp():
         output_path.unlink(missing_ok=True)
         return response
 
-    return send_file(
+    return _send_output(
         output_path,
         mimetype="image/webp",
-        as_attachment=True,
         download_name=Path(filename).stem + ".webp",
     )
 
@@ -1626,7 +2910,7 @@ def remove_background():
     input_name = f"{uuid.uuid4().hex}{suffix}"
     input_path = UPLOAD_DIR / input_name
     output_path = OUTPUT_DIR / f"{uuid.uuid4().hex}.png"
-    file.save(input_path)
+    _save_upload(file, input_path)
 
     try:
         # Read image
@@ -1678,10 +2962,9 @@ def remove_background():
         output_path.unlink(missing_ok=True)
         return response
 
-    return send_file(
+    return _send_output(
         output_path,
         mimetype="image/png",
-        as_attachment=True,
         download_name=Path(filename).stem + "_nobg.png",
     )
 
@@ -1754,11 +3037,11 @@ def remove_background_zip():
         max_value=5,
     )
 
-    batch_dir = OUTPUT_DIR / f"rembg_{uuid.uuid4().hex}"
+    batch_dir = SCRATCH_DIR / f"rembg_{_scratch_id()}"
     batch_dir.mkdir(parents=True, exist_ok=True)
-    zip_path = OUTPUT_DIR / f"nobg_{uuid.uuid4().hex}.zip"
-    
-    processed_files: list[tuple[str, Path]] = []
+
+    processed_files: list[Path] = []
+    entry_names: set[str] = set()
 
     try:
         # Get session once for all images (only needed for rembg methods)
@@ -1769,12 +3052,12 @@ def remove_background_zip():
                 continue
 
             suffix = _allowed_image_suffix(f.filename)
-            if suffix is None:
+            if suffix is None or _sniff_upload(f) not in _STATIC_IMAGE_FORMATS:
                 continue  # Skip unsupported files
 
             # Save input file
             input_path = batch_dir / f"input_{index:04d}{suffix}"
-            f.save(input_path)
+            _save_upload(f, input_path)
 
             try:
                 # Read and process image sequentially to avoid OOM
@@ -1811,16 +3094,15 @@ def remove_background_zip():
                     output_data = _remove_alpha(output_data, bg_color)
                 
                 # Save output
-                output_name = _safe_zip_entry_name_with_ext(
-                    Path(f.filename).stem + "_nobg",
-                    index=index,
-                    ext="png"
+                output_name = _unique_zip_entry_name(
+                    _safe_zip_entry_name_with_ext(_stem(f.filename) + "_nobg", index=index, ext="png"),
+                    entry_names,
                 )
                 output_path = batch_dir / output_name
                 with open(output_path, 'wb') as fp:
                     fp.write(output_data)
                 
-                processed_files.append((output_name, output_path))
+                processed_files.append(output_path)
                 
                 # Free output data and force garbage collection after each image
                 del output_data
@@ -1836,31 +3118,19 @@ def remove_background_zip():
         if not processed_files:
             abort(400, "Không có ảnh nào được xử lý thành công")
 
-        # Create ZIP file
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for name, path in processed_files:
-                zf.write(path, arcname=name)
-
     except HTTPException:
         shutil.rmtree(batch_dir, ignore_errors=True)
-        zip_path.unlink(missing_ok=True)
         raise
     except Exception as exc:
         shutil.rmtree(batch_dir, ignore_errors=True)
-        zip_path.unlink(missing_ok=True)
         abort(500, f"Lỗi xử lý: {exc}")
 
-    @after_this_request
-    def cleanup(response):
-        shutil.rmtree(batch_dir, ignore_errors=True)
-        zip_path.unlink(missing_ok=True)
-        return response
-
-    return send_file(
-        zip_path,
-        mimetype="application/zip",
-        as_attachment=True,
+    # PNG output is already zlib-compressed, so the archive is streamed STORED
+    # straight to the client instead of being staged as a second copy on disk.
+    return _zip_stream_response(
+        processed_files,
         download_name=f"nobg_{len(processed_files)}_images.zip",
+        cleanup_dir=batch_dir,
     )
 
 @app.post("/images-to-animated-webp")
@@ -1875,7 +3145,7 @@ def images_to_animated_webp():
     if width_raw not in (None, "", "0"):
         width = _validate_positive_int(width_raw, name="Width", min_value=64, max_value=2048)
 
-    batch_dir = OUTPUT_DIR / f"frames_{uuid.uuid4().hex}"
+    batch_dir = SCRATCH_DIR / f"frames_{_scratch_id()}"
     batch_dir.mkdir(parents=True, exist_ok=True)
     frame_paths: list[Path] = []
     output_path: Path | None = None
@@ -1885,10 +3155,10 @@ def images_to_animated_webp():
             if f.filename is None or f.filename == "":
                 continue
             suffix = _allowed_image_suffix(f.filename)
-            if suffix is None:
+            if suffix is None or _sniff_upload(f) not in _STATIC_IMAGE_FORMATS:
                 abort(400, "Chỉ chấp nhận PNG/JPG/JPEG (trong danh sách ảnh)")
             frame_path = batch_dir / f"frame_{index:04d}{suffix}"
-            f.save(frame_path)
+            _save_upload(f, frame_path)
             frame_paths.append(frame_path)
 
         if not frame_paths:
@@ -1904,32 +3174,31 @@ def images_to_animated_webp():
 
     @after_this_request
     def cleanup(response):  # type: ignore
-        shutil.rmtree(batch_dir, ignore_errors=True)
+        _remove_tree_later(batch_dir)
         if output_path is not None:
             output_path.unlink(missing_ok=True)
         return response
 
-    return send_file(
+    return _send_output(
         output_path,
         mimetype="image/webp",
-        as_attachment=True,
         download_name=f"images_{len(frame_paths)}frames_{fps}fps.webp",
     )
 
 
 @app.post("/mp4-to-animated-webp")
 def mp4_to_animated_webp():
-    file = request.files.get("file")
+    file = _single_upload()
     if file is None or file.filename == "":
         abort(400, "Thiếu file MP4")
 
-    fps = _validate_positive_int(request.form.get("fps"), name="FPS", min_value=1, max_value=60)
-    width_raw = request.form.get("width")
+    fps = _validate_positive_int(request.values.get("fps"), name="FPS", min_value=1, max_value=60)
+    width_raw = request.values.get("width")
     width: int | None = None
     if width_raw not in (None, "", "0"):
         width = _validate_positive_int(width_raw, name="Width", min_value=64, max_value=2048)
 
-    duration_raw = request.form.get("duration")
+    duration_raw = request.values.get("duration")
     duration: int | None = None
     if duration_raw not in (None, "", "0"):
         duration = _validate_positive_int(
@@ -1938,7 +3207,7 @@ def mp4_to_animated_webp():
 
     suffix = Path(file.filename).suffix or ".mp4"
     input_path = UPLOAD_DIR / f"{uuid.uuid4().hex}{suffix}"
-    file.save(input_path)
+    _save_upload(file, input_path)
 
     try:
         output_path = _convert_video_to_animated_webp(
@@ -1954,30 +3223,29 @@ def mp4_to_animated_webp():
         output_path.unlink(missing_ok=True)
         return response
 
-    return send_file(
+    return _send_output(
         output_path,
         mimetype="image/webp",
-        as_attachment=True,
         download_name=Path(file.filename).stem + ".webp",
     )
 
 
 @app.post("/gif-to-webp")
 def gif_to_webp():
-    file = request.files.get("file")
+    file = _single_upload()
     if file is None or file.filename == "":
         abort(400, "Thiếu file GIF")
 
     if _allowed_gif_suffix(file.filename) is None:
         abort(400, "Chỉ chấp nhận GIF")
 
-    fps = _validate_positive_int(request.form.get("fps"), name="FPS", min_value=1, max_value=60)
-    width_raw = request.form.get("width")
+    fps = _validate_positive_int(request.values.get("fps"), name="FPS", min_value=1, max_value=60)
+    width_raw = request.values.get("width")
     width: int | None = None
     if width_raw not in (None, "", "0"):
         width = _validate_positive_int(width_raw, name="Width", min_value=64, max_value=2048)
 
-    duration_raw = request.form.get("duration")
+    duration_raw = request.values.get("duration")
     duration: int | None = None
     if duration_raw not in (None, "", "0"):
         duration = _validate_positive_int(
@@ -1985,7 +3253,7 @@ def gif_to_webp():
         )
 
     input_path = UPLOAD_DIR / f"{uuid.uuid4().hex}.gif"
-    file.save(input_path)
+    _save_upload(file, input_path)
 
     try:
         output_path = _convert_video_to_animated_webp(
@@ -2001,10 +3269,9 @@ def gif_to_webp():
         output_path.unlink(missing_ok=True)
         return response
 
-    return send_file(
+    return _send_output(
         output_path,
         mimetype="image/webp",
-        as_attachment=True,
         download_name=Path(file.filename).stem + ".webp",
     )
 
@@ -2019,41 +3286,61 @@ def images_to_webp_zip():
     if not files:
         abort(400, "Thiếu danh sách ảnh (files)")
 
-    batch_dir = OUTPUT_DIR / f"webp_batch_{uuid.uuid4().hex}"
+    batch_dir = SCRATCH_DIR / f"webp_batch_{_scratch_id()}"
     batch_dir.mkdir(parents=True, exist_ok=True)
     zip_path = batch_dir / "webp_images.zip"
 
     # Track failed files
     failed_files: list[dict] = []
     successful_files: list[str] = []
-    output_paths: list[Path] = []
-    
+    outputs: list[str] = []
+
+    def convert_one(input_path: Path, suffix: str) -> bytes:
+        try:
+            return _convert_image_in_process(input_path, target="webp", lossless=(suffix == ".png"))
+        finally:
+            input_path.unlink(missing_ok=True)
+
     try:
+        jobs: list[tuple[str, Path, str, str]] = []
+        entry_names: set[str] = set()
         for index, f in enumerate(files, start=1):
             if f.filename is None or f.filename == "":
                 continue
             suffix = _allowed_image_suffix(f.filename)
-            if suffix is None:
+            if suffix is None or _sniff_upload(f) not in _STATIC_IMAGE_FORMATS:
                 failed_files.append({"file": f.filename, "error": "Định dạng không hỗ trợ (chỉ PNG/JPG/JPEG)"})
                 continue
 
             input_path = batch_dir / f"input_{index:04d}{suffix}"
-            f.save(input_path)
+            _save_upload(f, input_path)
+            output_name = _unique_zip_entry_name(
+                _safe_zip_entry_name(_stem(f.filename), index=index), entry_names
+            )
+            jobs.append((f.filename, input_path, output_name, suffix))
 
-            try:
-                output_name = _safe_zip_entry_name(Path(f.filename).stem, index=index)
-                output_path = batch_dir / output_name
-                _convert_image_to_webp(input_path, lossless=(suffix == ".png"), output_path=output_path)
-                output_paths.append(output_path)
-                successful_files.append(f.filename)
-            except Exception as e:
-                error_msg = str(e) if str(e) else "Lỗi không xác định khi chuyển đổi"
-                failed_files.append({"file": f.filename, "error": error_msg})
-                print(f"[DEBUG] images_to_webp_zip error for {f.filename}: {e}")
-            finally:
-                input_path.unlink(missing_ok=True)
+        # Files are independent, so convert them concurrently and collect the
+        # results in upload order to keep the archive layout stable.
+        futures = _submit_bounded(
+            partial(_batch_executor.submit, convert_one, input_path, suffix)
+            for _, input_path, _, suffix in jobs
+        )
+        # Archive each result as soon as it is ready, in upload order, instead
+        # of holding every encoded image until the last one finishes.
+        # WebP is already compressed; deflating it again only burns CPU.
+        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_STORED) as zf:
+            for (filename, _, output_name, _), future in zip(jobs, futures):
+                try:
+                    zf.writestr(output_name, future.result())
+                except Exception as e:
+                    error_msg = str(e) if str(e) else "Lỗi không xác định khi chuyển đổi"
+                    failed_files.append({"file": filename, "error": error_msg})
+                    print(f"[DEBUG] images_to_webp_zip error for {filename}: {e}")
+                    continue
+                outputs.append(output_name)
+                successful_files.append(filename)
 
-        if not output_paths:
+        if not outputs:
             # All files failed
             error_response = {
                 "success": False,
@@ -2064,10 +3351,6 @@ def images_to_webp_zip():
             }
             shutil.rmtree(batch_dir, ignore_errors=True)
             return jsonify(error_response), 400
-
-        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-            for output_path in output_paths:
-                zf.write(output_path, arcname=output_path.name)
                 
     except HTTPException:
         shutil.rmtree(batch_dir, ignore_errors=True)
@@ -2078,15 +3361,13 @@ def images_to_webp_zip():
 
     # If there are failed files, return JSON with download info
     if failed_files:
-        zip_id = uuid.uuid4().hex
-        final_zip_path = OUTPUT_DIR / f"images_webp_{zip_id}.zip"
-        shutil.copy(zip_path, final_zip_path)
+        zip_id = _park_zip(zip_path, "images_webp_")
         shutil.rmtree(batch_dir, ignore_errors=True)
         
         response_data = {
             "success": True,
-            "message": f"Đã chuyển đổi {len(output_paths)} file thành công, {len(failed_files)} file bị lỗi",
-            "successful_count": len(output_paths),
+            "message": f"Đã chuyển đổi {len(outputs)} file thành công, {len(failed_files)} file bị lỗi",
+            "successful_count": len(outputs),
             "successful_files": successful_files,
             "failed_count": len(failed_files),
             "failed_files": failed_files,
@@ -2097,14 +3378,13 @@ def images_to_webp_zip():
 
     @after_this_request
     def cleanup(response):
-        shutil.rmtree(batch_dir, ignore_errors=True)
+        _remove_tree_later(batch_dir)
         return response
 
-    return send_file(
+    return _send_output(
         zip_path,
         mimetype="application/zip",
-        as_attachment=True,
-        download_name=f"images_{len(output_paths)}_webp.zip",
+        download_name=f"images_{len(outputs)}_webp.zip",
     )
 
 
@@ -2114,116 +3394,132 @@ def download_images_webp(zip_id: str):
     if not zip_id or not all(c in '0123456789abcdef' for c in zip_id.lower()):
         abort(400, "ID không hợp lệ")
     
-    zip_path = OUTPUT_DIR / f"images_webp_{zip_id}.zip"
-    if not zip_path.exists():
-        abort(404, "File không tồn tại hoặc đã hết hạn")
-    
-    @after_this_request
-    def cleanup(response):
-        zip_path.unlink(missing_ok=True)
-        return response
-    
-    return send_file(
-        zip_path,
-        mimetype="application/zip",
-        as_attachment=True,
-        download_name=f"images_webp.zip",
+    return _send_parked_zip(
+        OUTPUT_DIR / f"images_webp_{zip_id}.zip", download_name="images_webp.zip"
     )
 
 
-@app.post("/images-convert-zip")
-def images_convert_zip():
-    files = request.files.getlist("files")
-    if not files:
-        abort(400, "Thiếu danh sách ảnh (files)")
-
-    target = (request.form.get("format") or "").strip().lower()
+def _images_convert_options(form: dict[str, str]) -> tuple[str, int | None, int | None, bool | None]:
+    target = (form.get("format") or "").strip().lower()
     if target == "jpeg":
         target = "jpg"
     if target not in {"webp", "png", "jpg"}:
         abort(400, "Thiếu/ sai format (webp/png/jpg)")
 
-    width_raw = request.form.get("width")
+    width_raw = form.get("width")
     width: int | None = None
     if width_raw not in (None, "", "0"):
         width = _validate_positive_int(width_raw, name="Width", min_value=16, max_value=4096)
 
-    quality_raw = request.form.get("quality")
+    quality_raw = form.get("quality")
     quality: int | None = None
     if target in {"webp", "jpg"} and quality_raw not in (None, "", "0"):
         quality = _validate_positive_int(quality_raw, name="Quality", min_value=1, max_value=100)
 
     lossless_override: bool | None = None
-    if target == "webp" and request.form.get("lossless") is not None:
-        lossless_override = _parse_bool(request.form.get("lossless"))
+    if target == "webp" and form.get("lossless") is not None:
+        lossless_override = _parse_bool(form.get("lossless"))
 
-    batch_dir = OUTPUT_DIR / f"img_convert_{uuid.uuid4().hex}"
-    batch_dir.mkdir(parents=True, exist_ok=True)
-    zip_path = batch_dir / "converted_images.zip"
+    return target, width, quality, lossless_override
 
-    output_paths: list[Path] = []
-    try:
-        for index, f in enumerate(files, start=1):
-            if f.filename is None or f.filename == "":
-                continue
 
-            suffix = _allowed_static_image_suffix(f.filename)
-            if suffix is None:
-                abort(400, "Chỉ chấp nhận PNG/JPG/JPEG/WebP (trong danh sách ảnh)")
+@app.post("/images-convert-zip")
+def images_convert_zip():
+    """Batch convert static images to webp/png/jpg as a ZIP.
 
-            input_path = batch_dir / f"input_{index:04d}{suffix}"
-            f.save(input_path)
+    The body is parsed as it streams in: when the option fields come before the
+    files (as the bundled clients send them), each image is handed to the
+    worker pool as soon as it has been received.
+    """
+    batch_dir = SCRATCH_DIR / f"img_convert_{_scratch_id()}"
+    batch_dir.mkdir(parents=True, exist_ok=True)
 
-            output_ext = f".{target}"
-            output_name = _safe_zip_entry_name_with_ext(Path(f.filename).stem, index=index, ext=output_ext)
-            output_path = batch_dir / output_name
+    form: dict[str, str] = {}
+    options: tuple | None = None
+    pending: list[tuple[int, str, Path]] = []
+    output_names: list[str] = []
+    futures: list[Future] = []
+    entry_names: set[str] = set()
+    file_count = 0
+
+    def submit(index: int, filename: str, input_path: Path) -> None:
+        target, width, quality, lossless_override = options
+        output_name = _unique_zip_entry_name(
+            _safe_zip_entry_name_with_ext(_stem(filename), index=index, ext=f".{target}"),
+            entry_names,
+        )
 
-            lossless = False
-            if target == "webp":
-                if lossless_override is None:
-                    lossless = suffix == ".png"
-                else:
-                    lossless = lossless_override
+        lossless = False
+        if target == "webp":
+            if lossless_override is None:
+                lossless = _suffix_lower(filename) == ".png"
+            else:
+                lossless = lossless_override
 
-            _convert_image(
+        futures.append(
+            _batch_executor.submit(
+                _convert_image_in_process,
                 input_path,
                 target=target,
                 width=width,
                 quality=quality,
                 lossless=lossless,
-                output_path=output_path,
             )
-            output_paths.append(output_path)
+        )
+        output_names.append(output_name)
 
-        if not output_paths:
-            abort(400, "Không có ảnh hợp lệ")
+    try:
+        for name, filename, value in _iter_multipart_uploads(batch_dir):
+            if filename is None:
+                form.setdefault(name, value)
+                continue
+            if name != "files":
+                continue
+            file_count += 1
+            if filename == "":
+                continue
+            if _allowed_static_image_suffix(filename) is None:
+                abort(400, "Chỉ chấp nhận PNG/JPG/JPEG/WebP (trong danh sách ảnh)")
 
-        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-            for output_path in output_paths:
-                zf.write(output_path, arcname=output_path.name)
+            pending.append((file_count, filename, value))
+            if options is None and "format" in form:
+                options = _images_convert_options(form)
+            if options is not None:
+                for item in pending:
+                    submit(*item)
+                pending.clear()
+
+        if file_count == 0:
+            abort(400, "Thiếu danh sách ảnh (files)")
+        if options is None:
+            # Options came after the files; everything is on disk by now.
+            options = _images_convert_options(form)
+        for item in pending:
+            submit(*item)
+        if not output_names:
+            abort(400, "Không có ảnh hợp lệ")
+        outputs = list(zip(output_names, _wait_in_order(futures)))
     except HTTPException:
+        for future in futures:
+            future.cancel()
         shutil.rmtree(batch_dir, ignore_errors=True)
         raise
     except Exception as exc:  # pragma: no cover
+        for future in futures:
+            future.cancel()
         shutil.rmtree(batch_dir, ignore_errors=True)
-        abort(500, f"Lỗi ffmpeg/zip: {exc}")
-
-    @after_this_request
-    def cleanup(response):  # type: ignore
-        shutil.rmtree(batch_dir, ignore_errors=True)
-        return response
+        abort(500, f"Lỗi convert/zip: {exc}")
 
-    return send_file(
-        zip_path,
-        mimetype="application/zip",
-        as_attachment=True,
-        download_name=f"images_{len(output_paths)}_{target}.zip",
+    return _zip_stream_response(
+        outputs,
+        download_name=f"images_{len(outputs)}_{options[0]}.zip",
+        cleanup_dir=batch_dir,
     )
 
 
 @app.post("/tgs-to-gif-zip")
 def tgs_to_gif_zip():
-    """Batch convert TGS files to GIF and return as ZIP."""
+    """Batch convert TGS files to GIF (or animated WebP with ``format=webp``) as a ZIP."""
     files = request.files.getlist("files")
     if not files:
         abort(400, "Thiếu danh sách file TGS (files)")
@@ -2244,12 +3540,21 @@ def tgs_to_gif_zip():
     if fps_raw not in (None, "", "0"):
         fps = _validate_positive_int(fps_raw, name="FPS", min_value=1, max_value=60)
 
+    target = (request.form.get("format") or "gif").strip().lower()
+    if target not in {"gif", "webp"}:
+        abort(400, "Định dạng output không hợp lệ (format: gif/webp)")
+    render = _render_tgs_to_webp if target == "webp" else _render_tgs_to_gif
+
+    if not HAS_LOTTIE:
+        abort(500, "Lottie library không được cài đặt. Cần cài đặt 'lottie'.")
+
     # Create batch directory
-    batch_dir = OUTPUT_DIR / f"tgs_convert_{uuid.uuid4().hex}"
+    batch_dir = SCRATCH_DIR / f"tgs_convert_{_scratch_id()}"
     batch_dir.mkdir(parents=True, exist_ok=True)
-    zip_path = batch_dir / "converted_gifs.zip"
 
-    output_paths: list[Path] = []
+    jobs: list[tuple[Path, Path]] = []
+    entry_names: set[str] = set()
+    futures = []
     try:
         for index, f in enumerate(files, start=1):
             if f.filename is None or f.filename == "":
@@ -2260,48 +3565,50 @@ def tgs_to_gif_zip():
 
             # Save input TGS file
             input_path = batch_dir / f"input_{index:04d}.tgs"
-            f.save(input_path)
+            _save_upload(f, input_path)
 
             # Generate output filename
-            output_name = _safe_zip_entry_name_with_ext(Path(f.filename).stem, index=index, ext=".gif")
-            output_path = batch_dir / output_name
-
-            # Convert TGS to GIF
-            _convert_tgs_to_gif(
-                input_path,
-                width=width,
-                quality=quality,
-                fps=fps,
-                output_path=output_path,
+            # Jobs render concurrently, so two stickers must not share an output.
+            output_name = _unique_zip_entry_name(
+                _safe_zip_entry_name_with_ext(_stem(f.filename), index=index, ext=f".{target}"),
+                entry_names,
             )
-            output_paths.append(output_path)
+            output_path = batch_dir / output_name
+            jobs.append((input_path, output_path))
 
-        if not output_paths:
+        if not jobs:
             abort(400, "Không có file TGS hợp lệ")
 
-        # Create ZIP file
-        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-            for output_path in output_paths:
-                zf.write(output_path, arcname=output_path.name)
+        # Render every sticker in the worker processes, then wait in upload order.
+        pool = _tgs_render_pool()
+        for input_path, output_path in jobs:
+            futures.append(
+                pool.submit(
+                    render,
+                    input_path,
+                    width=width,
+                    quality=quality,
+                    fps=fps,
+                    output_path=output_path,
+                )
+            )
+        for future in futures:
+            future.result()
+        output_paths = [output_path for _, output_path in jobs]
 
     except HTTPException:
         shutil.rmtree(batch_dir, ignore_errors=True)
         raise
     except Exception as exc:
+        for future in futures:
+            future.cancel()
         shutil.rmtree(batch_dir, ignore_errors=True)
         abort(500, f"Lỗi chuyển đổi TGS: {exc}")
 
-    # Cleanup after request
-    @after_this_request
-    def cleanup(response):  # type: ignore
-        shutil.rmtree(batch_dir, ignore_errors=True)
-        return response
-
-    return send_file(
-        zip_path,
-        mimetype="application/zip",
-        as_attachment=True,
-        download_name=f"tgs_to_gif_{len(output_paths)}.zip",
+    return _zip_stream_response(
+        output_paths,
+        download_name=f"tgs_to_{target}_{len(output_paths)}.zip",
+        cleanup_dir=batch_dir,
     )
 
 
@@ -2321,11 +3628,11 @@ def files_to_tgs_zip():
     
     # If single file is a zip, extract it first
     if len(files) == 1 and files[0].filename and files[0].filename.lower().endswith('.zip'):
-        temp_extract_dir = OUTPUT_DIR / f"extract_{uuid.uuid4().hex}"
+        temp_extract_dir = SCRATCH_DIR / f"extract_{_scratch_id()}"
         temp_extract_dir.mkdir(parents=True, exist_ok=True)
         
         zip_upload_path = temp_extract_dir / "uploaded.zip"
-        files[0].save(zip_upload_path)
+        _save_upload(files[0], zip_upload_path)
         
         try:
             with zipfile.ZipFile(zip_upload_path, 'r') as zf:
@@ -2333,7 +3640,7 @@ def files_to_tgs_zip():
                     # Skip directories and hidden files
                     if member.endswith('/') or member.startswith('__MACOSX') or '/.' in member:
                         continue
-                    member_suffix = Path(member).suffix.lower()
+                    member_suffix = _suffix_lower(member)
                     if member_suffix in {'.json', '.gif', '.webp', '.webm', '.png', '.jpg', '.jpeg'}:
                         # Extract to temp directory with safe name
                         extracted_filename = Path(member).name
@@ -2361,11 +3668,13 @@ def files_to_tgs_zip():
         fps = _validate_positive_int(fps_raw, name="FPS", min_value=1, max_value=60)
 
     # Create batch directory
-    batch_dir = OUTPUT_DIR / f"to_tgs_{uuid.uuid4().hex}"
+    batch_dir = SCRATCH_DIR / f"to_tgs_{_scratch_id()}"
     batch_dir.mkdir(parents=True, exist_ok=True)
-    zip_path = batch_dir / "converted_tgs.zip"
 
     output_paths: list[Path] = []
+    tasks: list[partial] = []
+    # Tasks run concurrently: "a.json" and "a.gif" must not both write "a.tgs".
+    entry_names: set[str] = set()
     try:
         # Process files - either from extracted zip or direct uploads
         if extracted_files:
@@ -2375,14 +3684,20 @@ def files_to_tgs_zip():
                 filename_stem = file_path.stem
 
                 if file_suffix == ".json":
-                    output_name = _safe_zip_entry_name_with_ext(filename_stem, index=index, ext=".tgs")
+                    output_name = _unique_zip_entry_name(
+                        _safe_zip_entry_name_with_ext(filename_stem, index=index, ext=".tgs"), entry_names
+                    )
                     output_path = batch_dir / output_name
-                    _convert_json_to_tgs(file_path, output_path=output_path)
+                    tasks.append(partial(_convert_json_to_tgs, file_path, output_path=output_path))
                     output_paths.append(output_path)
                 elif file_suffix in {".gif", ".webp", ".webm", ".png", ".jpg", ".jpeg"}:
-                    output_name = _safe_zip_entry_name_with_ext(filename_stem, index=index, ext=".tgs")
+                    output_name = _unique_zip_entry_name(
+                        _safe_zip_entry_name_with_ext(filename_stem, index=index, ext=".tgs"), entry_names
+                    )
                     output_path = batch_dir / output_name
-                    _convert_gif_to_tgs(file_path, fps=fps, width=width, output_path=output_path)
+                    tasks.append(
+                        partial(_convert_gif_to_tgs, file_path, fps=fps, width=width, output_path=output_path)
+                    )
                     output_paths.append(output_path)
         else:
             # Processing regular file uploads
@@ -2390,29 +3705,35 @@ def files_to_tgs_zip():
                 if f.filename is None or f.filename == "":
                     continue
 
-                file_suffix = Path(f.filename).suffix.lower()
+                file_suffix = _suffix_lower(f.filename)
 
                 # Determine file type and conversion path
                 if file_suffix == ".json":
                     # JSON to TGS (direct conversion)
                     input_path = batch_dir / f"input_{index:04d}.json"
-                    f.save(input_path)
+                    _save_upload(f, input_path)
 
-                    output_name = _safe_zip_entry_name_with_ext(Path(f.filename).stem, index=index, ext=".tgs")
+                    output_name = _unique_zip_entry_name(
+                        _safe_zip_entry_name_with_ext(_stem(f.filename), index=index, ext=".tgs"), entry_names
+                    )
                     output_path = batch_dir / output_name
 
-                    _convert_json_to_tgs(input_path, output_path=output_path)
+                    tasks.append(partial(_convert_json_to_tgs, input_path, output_path=output_path))
                     output_paths.append(output_path)
 
                 elif file_suffix in {".gif", ".webp", ".webm", ".png", ".jpg", ".jpeg"}:
                     # Raster formats to TGS (experimental conversion)
                     input_path = batch_dir / f"input_{index:04d}{file_suffix}"
-                    f.save(input_path)
+                    _save_upload(f, input_path)
 
-                    output_name = _safe_zip_entry_name_with_ext(Path(f.filename).stem, index=index, ext=".tgs")
+                    output_name = _unique_zip_entry_name(
+                        _safe_zip_entry_name_with_ext(_stem(f.filename), index=index, ext=".tgs"), entry_names
+                    )
                     output_path = batch_dir / output_name
 
-                    _convert_gif_to_tgs(input_path, fps=fps, width=width, output_path=output_path)
+                    tasks.append(
+                        partial(_convert_gif_to_tgs, input_path, fps=fps, width=width, output_path=output_path)
+                    )
                     output_paths.append(output_path)
 
                 else:
@@ -2420,11 +3741,8 @@ def files_to_tgs_zip():
 
         if not output_paths:
             abort(400, "Không có file hợp lệ để chuyển đổi")
-
-        # Create ZIP file
-        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-            for output_path in output_paths:
-                zf.write(output_path, arcname=output_path.name)
+        # Inputs are all on disk and validated; convert them concurrently.
+        _wait_in_order([_batch_executor.submit(task) for task in tasks])
 
     except HTTPException:
         shutil.rmtree(batch_dir, ignore_errors=True)
@@ -2437,19 +3755,15 @@ def files_to_tgs_zip():
             shutil.rmtree(temp_extract_dir, ignore_errors=True)
         abort(500, f"Lỗi chuyển đổi sang TGS: {exc}")
 
-    # Cleanup after request
-    @after_this_request
-    def cleanup(response):  # type: ignore
-        shutil.rmtree(batch_dir, ignore_errors=True)
-        if temp_extract_dir:
-            shutil.rmtree(temp_extract_dir, ignore_errors=True)
-        return response
+    # The extracted inputs are no longer needed once every file is converted.
+    if temp_extract_dir:
+        shutil.rmtree(temp_extract_dir, ignore_errors=True)
 
-    return send_file(
-        zip_path,
-        mimetype="application/zip",
-        as_attachment=True,
+    # TGS is gzipped JSON already; stream it STORED as it is read.
+    return _zip_stream_response(
+        output_paths,
         download_name=f"to_tgs_{len(output_paths)}.zip",
+        cleanup_dir=batch_dir,
     )
 
 
@@ -2486,47 +3800,50 @@ def batch_animated_resize_zip():
     if quality_raw not in (None, "", "0"):
         quality = _validate_positive_int(quality_raw, name="Quality", min_value=1, max_value=100)
 
-    batch_dir = OUTPUT_DIR / f"animated_resize_{uuid.uuid4().hex}"
+    batch_dir = SCRATCH_DIR / f"animated_resize_{_scratch_id()}"
     batch_dir.mkdir(parents=True, exist_ok=True)
-    zip_path = batch_dir / "resized_animated.zip"
 
     output_paths: list[Path] = []
+    tasks: list[partial] = []
+    entry_names: set[str] = set()
     try:
         for index, f in enumerate(files, start=1):
             if f.filename is None or f.filename == "":
                 continue
 
             # Check if it's WebP or GIF
-            suffix = Path(f.filename).suffix.lower()
-            if suffix not in {".webp", ".gif"}:
+            suffix = _suffix_lower(f.filename)
+            if suffix not in {".webp", ".gif"} or _sniff_upload(f) not in {"webp", "gif"}:
                 abort(400, "Chỉ chấp nhận WebP hoặc GIF")
 
             input_path = batch_dir / f"input_{index:04d}{suffix}"
-            f.save(input_path)
+            _save_upload(f, input_path)
 
-            output_name = _safe_zip_entry_name_with_ext(
-                Path(f.filename).stem, index=index, ext=suffix
+            output_name = _unique_zip_entry_name(
+                _safe_zip_entry_name_with_ext(_stem(f.filename), index=index, ext=suffix),
+                entry_names,
             )
             output_path = batch_dir / output_name
 
             # Resize with optional parameters
-            _resize_animated_media(
-                input_path,
-                width=width,
-                height=height,
-                quality=quality,
-                target_size_kb=target_size_kb,
-                output_path=output_path,
+            tasks.append(
+                partial(
+                    _cached_convert,
+                    _resize_animated_media,
+                    input_path,
+                    width=width,
+                    height=height,
+                    quality=quality,
+                    target_size_kb=target_size_kb,
+                    output_path=output_path,
+                )
             )
             output_paths.append(output_path)
 
         if not output_paths:
             abort(400, "Không có file hợp lệ")
-
-        # Create ZIP file
-        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-            for output_path in output_paths:
-                zf.write(output_path, arcname=output_path.name)
+        # Inputs are all on disk and validated; convert them concurrently.
+        _wait_in_order([_batch_executor.submit(task) for task in tasks])
 
     except HTTPException:
         shutil.rmtree(batch_dir, ignore_errors=True)
@@ -2535,16 +3852,10 @@ def batch_animated_resize_zip():
         shutil.rmtree(batch_dir, ignore_errors=True)
         abort(500, f"Lỗi xử lý: {exc}")
 
-    @after_this_request
-    def cleanup(response):  # type: ignore
-        shutil.rmtree(batch_dir, ignore_errors=True)
-        return response
-
-    return send_file(
-        zip_path,
-        mimetype="application/zip",
-        as_attachment=True,
+    return _zip_stream_response(
+        output_paths,
         download_name=f"resized_{len(output_paths)}_animated.zip",
+        cleanup_dir=batch_dir,
     )
 
 
@@ -2582,48 +3893,51 @@ def webp_resize_zip():
     if quality_raw not in (None, "", "0"):
         quality = _validate_positive_int(quality_raw, name="Quality", min_value=1, max_value=100)
 
-    batch_dir = OUTPUT_DIR / f"webp_resize_{uuid.uuid4().hex}"
+    batch_dir = SCRATCH_DIR / f"webp_resize_{_scratch_id()}"
     batch_dir.mkdir(parents=True, exist_ok=True)
-    zip_path = batch_dir / "resized_images.zip"
 
     output_paths: list[Path] = []
+    tasks: list[partial] = []
+    entry_names: set[str] = set()
     try:
         for index, f in enumerate(files, start=1):
             if f.filename is None or f.filename == "":
                 continue
 
             suffix = _allowed_static_image_suffix(f.filename)
-            if suffix is None:
+            if suffix is None or _sniff_upload(f) not in _STATIC_IMAGE_FORMATS:
                 abort(400, "Chỉ chấp nhận PNG/JPG/JPEG/WebP")
 
             input_path = batch_dir / f"input_{index:04d}{suffix}"
-            f.save(input_path)
+            _save_upload(f, input_path)
 
             output_ext = f".{target}"
-            output_name = _safe_zip_entry_name_with_ext(
-                Path(f.filename).stem, index=index, ext=output_ext
+            output_name = _unique_zip_entry_name(
+                _safe_zip_entry_name_with_ext(_stem(f.filename), index=index, ext=output_ext),
+                entry_names,
             )
             output_path = batch_dir / output_name
 
             # Convert with size constraints
-            _convert_image(
-                input_path,
-                target=target,
-                width=width,
-                quality=quality,
-                lossless=False,
-                output_path=output_path,
-                target_size_kb=target_size_kb,
+            tasks.append(
+                partial(
+                    _cached_convert,
+                    _convert_image,
+                    input_path,
+                    target=target,
+                    width=width,
+                    quality=quality,
+                    lossless=False,
+                    output_path=output_path,
+                    target_size_kb=target_size_kb,
+                )
             )
             output_paths.append(output_path)
 
         if not output_paths:
             abort(400, "Không có file hợp lệ")
-
-        # Create ZIP file
-        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-            for output_path in output_paths:
-                zf.write(output_path, arcname=output_path.name)
+        # Inputs are all on disk and validated; convert them concurrently.
+        _wait_in_order([_batch_executor.submit(task) for task in tasks])
 
     except HTTPException:
         shutil.rmtree(batch_dir, ignore_errors=True)
@@ -2632,33 +3946,27 @@ def webp_resize_zip():
         shutil.rmtree(batch_dir, ignore_errors=True)
         abort(500, f"Lỗi chuyển đổi: {exc}")
 
-    @after_this_request
-    def cleanup(response):  # type: ignore
-        shutil.rmtree(batch_dir, ignore_errors=True)
-        return response
-
-    return send_file(
-        zip_path,
-        mimetype="application/zip",
-        as_attachment=True,
+    return _zip_stream_response(
+        output_paths,
         download_name=f"resized_{len(output_paths)}_{target}.zip",
+        cleanup_dir=batch_dir,
     )
 
 
 @app.post("/webm-to-gif")
 def webm_to_gif():
-    file = request.files.get("file")
+    file = _single_upload()
     if file is None or file.filename == "":
         abort(400, "Thiếu file WebM")
 
-    fps = _validate_positive_int(request.form.get("fps"), name="FPS", min_value=1, max_value=60)
-    width_raw = request.form.get("width")
+    fps = _validate_positive_int(request.values.get("fps"), name="FPS", min_value=1, max_value=60)
+    width_raw = request.values.get("width")
     width: int = 640
     if width_raw not in (None, "", "0"):
         width = _validate_positive_int(width_raw, name="Width", min_value=64, max_value=2048)
 
     input_path = UPLOAD_DIR / f"{uuid.uuid4().hex}.webm"
-    file.save(input_path)
+    _save_upload(file, input_path)
 
     try:
         output_path = _convert_webm_to_gif(input_path, fps=fps, width=width)
@@ -2672,10 +3980,9 @@ def webm_to_gif():
         output_path.unlink(missing_ok=True)
         return response
 
-    return send_file(
+    return _send_output(
         output_path,
         mimetype="image/gif",
-        as_attachment=True,
         download_name=Path(file.filename).stem + ".gif",
     )
 
@@ -2708,7 +4015,7 @@ def batch_to_webp_zip():
     if quality_raw not in (None, "", "0"):
         quality = _validate_positive_int(quality_raw, name="Quality", min_value=1, max_value=100)
 
-    batch_dir = OUTPUT_DIR / f"batch_webp_{uuid.uuid4().hex}"
+    batch_dir = SCRATCH_DIR / f"batch_webp_{_scratch_id()}"
     batch_dir.mkdir(parents=True, exist_ok=True)
     zip_path = batch_dir / "converted_webp.zip"
 
@@ -2718,46 +4025,22 @@ def batch_to_webp_zip():
     failed_files: list[dict] = []
     successful_files: list[str] = []
 
-    def process_single_file(input_path: Path, original_name: str, index: int) -> Path | None:
-        """Process a single file and return output path or None if failed."""
+    def process_single_file(input_path: Path, output_path: Path) -> Path:
+        """Convert one non-TGS file to WebP; runs on the batch thread pool."""
         suffix = input_path.suffix.lower()
-        output_name = _safe_zip_entry_name(Path(original_name).stem, index=index)
-        output_path = batch_dir / output_name
-
         try:
-            if suffix == ".tgs":
-                # TGS → animated WebP (via GIF intermediate)
-                if HAS_LOTTIE:
-                    gif_path = batch_dir / f"temp_{index}.gif"
-                    _convert_tgs_to_gif(input_path, width=width, fps=fps, output_path=gif_path)
-                    _convert_video_to_animated_webp(gif_path, fps=fps, width=width, loop=0, output_path=output_path)
-                    gif_path.unlink(missing_ok=True)
-                else:
-                    failed_files.append({"file": original_name, "error": "Thiếu thư viện lottie để xử lý TGS"})
-                    return None
-            elif suffix == ".webm":
-                # WebM → animated WebP
-                _convert_video_to_animated_webp(input_path, fps=fps, width=width, loop=0, output_path=output_path)
-            elif suffix == ".gif":
-                # GIF → animated WebP
+            if suffix in {".webm", ".gif"}:
+                # WebM/GIF → animated WebP
                 _convert_video_to_animated_webp(input_path, fps=fps, width=width, loop=0, output_path=output_path)
-            elif suffix in {".png", ".jpg", ".jpeg", ".webp"}:
+            else:
                 # Static image → WebP
                 _convert_image(input_path, target="webp", width=width, quality=quality, lossless=(suffix == ".png"), output_path=output_path)
-            else:
-                failed_files.append({"file": original_name, "error": f"Định dạng không được hỗ trợ: {suffix}"})
-                return None
-            successful_files.append(original_name)
-            return output_path
-        except Exception as e:
-            error_msg = str(e) if str(e) else "Lỗi không xác định khi chuyển đổi"
-            failed_files.append({"file": original_name, "error": error_msg})
-            print(f"[DEBUG] process_single_file error for {original_name}: {e}")
-            import traceback
-            traceback.print_exc()
-            return None
+        finally:
+            input_path.unlink(missing_ok=True)
+        return output_path
 
     output_paths: list[Path] = []
+    jobs: list[tuple[Path, str, int]] = []
     file_index = 0
 
     try:
@@ -2765,12 +4048,12 @@ def batch_to_webp_zip():
             if f.filename is None or f.filename == "":
                 continue
 
-            suffix = Path(f.filename).suffix.lower()
+            suffix = _suffix_lower(f.filename)
 
             if suffix == ".zip":
                 # Handle ZIP file - extract and process contents
                 zip_input = batch_dir / f"input_{uuid.uuid4().hex}.zip"
-                f.save(zip_input)
+                _save_upload(f, zip_input)
                 
                 extract_dir = batch_dir / f"extract_{uuid.uuid4().hex}"
                 extract_dir.mkdir(parents=True, exist_ok=True)
@@ -2780,40 +4063,77 @@ def batch_to_webp_zip():
                         for member in zf.namelist():
                             if member.endswith("/"):  # Skip directories
                                 continue
-                            member_suffix = Path(member).suffix.lower()
+                            member_suffix = _suffix_lower(member)
                             if member_suffix not in SUPPORTED_EXTENSIONS:
                                 failed_files.append({"file": Path(member).name, "error": f"Định dạng không được hỗ trợ: {member_suffix}"})
                                 continue
                             
                             # Extract file
-                            extracted = extract_dir / Path(member).name
+                            file_index += 1
+                            extracted = extract_dir / f"input_{file_index:04d}{member_suffix}"
                             with zf.open(member) as src, open(extracted, "wb") as dst:
                                 dst.write(src.read())
-                            
-                            file_index += 1
-                            result = process_single_file(extracted, Path(member).name, file_index)
-                            if result:
-                                output_paths.append(result)
-                            extracted.unlink(missing_ok=True)
+                            jobs.append((extracted, Path(member).name, file_index))
                 except zipfile.BadZipFile:
                     failed_files.append({"file": f.filename, "error": "File ZIP không hợp lệ hoặc bị hỏng"})
                 finally:
-                    shutil.rmtree(extract_dir, ignore_errors=True)
                     zip_input.unlink(missing_ok=True)
             
             elif suffix in SUPPORTED_EXTENSIONS:
                 # Direct file processing
-                input_path = batch_dir / f"input_{uuid.uuid4().hex}{suffix}"
-                f.save(input_path)
-                
+                kind = _sniff_upload(f)
+                if kind is None or (suffix == ".tgs") != (kind == "gzip"):
+                    failed_files.append({"file": f.filename, "error": "Nội dung file không khớp định dạng"})
+                    continue
                 file_index += 1
-                result = process_single_file(input_path, f.filename, file_index)
-                if result:
-                    output_paths.append(result)
-                input_path.unlink(missing_ok=True)
+                input_path = batch_dir / f"input_{file_index:04d}{suffix}"
+                _save_upload(f, input_path)
+                jobs.append((input_path, f.filename, file_index))
             else:
                 failed_files.append({"file": f.filename, "error": f"Định dạng không được hỗ trợ: {suffix}"})
 
+        # Every input is on disk now; convert them concurrently. TGS rendering
+        # is pure Python, so it goes to the process pool instead of a thread.
+        submits: list[tuple[str, partial]] = []
+        entry_names: set[str] = set()
+        for input_path, original_name, index in jobs:
+            output_path = batch_dir / _unique_zip_entry_name(
+                _safe_zip_entry_name(_stem(original_name), index=index), entry_names
+            )
+            if input_path.suffix.lower() != ".tgs":
+                submit = partial(_batch_executor.submit, process_single_file, input_path, output_path)
+            elif HAS_LOTTIE:
+                # TGS → animated WebP, rendered directly without a GIF intermediate
+                submit = partial(
+                    _tgs_render_pool().submit,
+                    _render_tgs_to_webp, input_path, width=width, quality=quality, fps=fps, output_path=output_path
+                )
+            else:
+                failed_files.append({"file": original_name, "error": "Thiếu thư viện lottie để xử lý TGS"})
+                continue
+            submits.append((original_name, submit))
+
+        # Archive each result as soon as it is ready, while later files are still
+        # converting. Entries keep upload order so the layout stays stable, and
+        # the bounded window keeps converted outputs from outrunning the archive.
+        # WebP output is already compressed; store it as is.
+        # The inputs' total size is a rough bound for the archive.
+        size_hint = sum(input_path.stat().st_size for input_path, _, _ in jobs)
+        futures = _submit_bounded(submit for _, submit in submits)
+        with _preallocated_zip(zip_path, size_hint) as zf:
+            for (original_name, _), future in zip(submits, futures):
+                try:
+                    output_path = future.result()
+                except Exception as e:
+                    error_msg = str(e) if str(e) else "Lỗi không xác định khi chuyển đổi"
+                    failed_files.append({"file": original_name, "error": error_msg})
+                    print(f"[DEBUG] process_single_file error for {original_name}: {e}")
+                    continue
+                _zip_write_file(zf, output_path, output_path.name)
+                output_path.unlink(missing_ok=True)
+                output_paths.append(output_path)
+                successful_files.append(original_name)
+
         if not output_paths:
             # All files failed - return error with details
             error_response = {
@@ -2826,11 +4146,6 @@ def batch_to_webp_zip():
             shutil.rmtree(batch_dir, ignore_errors=True)
             return jsonify(error_response), 400
 
-        # Create output ZIP
-        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-            for output_path in output_paths:
-                zf.write(output_path, arcname=output_path.name)
-
     except HTTPException:
         shutil.rmtree(batch_dir, ignore_errors=True)
         raise
@@ -2841,9 +4156,7 @@ def batch_to_webp_zip():
     # If there are failed files, return JSON with download info
     if failed_files:
         # Store zip for download and return JSON response
-        zip_id = uuid.uuid4().hex
-        final_zip_path = OUTPUT_DIR / f"batch_webp_{zip_id}.zip"
-        shutil.copy(zip_path, final_zip_path)
+        zip_id = _park_zip(zip_path, "batch_webp_")
         shutil.rmtree(batch_dir, ignore_errors=True)
         
         response_data = {
@@ -2860,13 +4173,12 @@ def batch_to_webp_zip():
 
     @after_this_request
     def cleanup(response):
-        shutil.rmtree(batch_dir, ignore_errors=True)
+        _remove_tree_later(batch_dir)
         return response
 
-    return send_file(
+    return _send_output(
         zip_path,
         mimetype="application/zip",
-        as_attachment=True,
         download_name=f"batch_webp_{len(output_paths)}.zip",
     )
 
@@ -2878,933 +4190,38 @@ def download_batch_webp(zip_id: str):
     if not zip_id or not all(c in '0123456789abcdef' for c in zip_id.lower()):
         abort(400, "ID không hợp lệ")
     
-    zip_path = OUTPUT_DIR / f"batch_webp_{zip_id}.zip"
-    if not zip_path.exists():
-        abort(404, "File không tồn tại hoặc đã hết hạn")
-    
-    @after_this_request
-    def cleanup(response):
-        zip_path.unlink(missing_ok=True)
-        return response
-    
-    return send_file(
-        zip_path,
-        mimetype="application/zip",
-        as_attachment=True,
-        download_name=f"batch_webp.zip",
+    return _send_parked_zip(
+        OUTPUT_DIR / f"batch_webp_{zip_id}.zip", download_name="batch_webp.zip"
     )
 
 
 # ---------------------------- Analytics Dashboard -------------------------
 
+@lru_cache(maxsize=1)
+def _analytics_page_bodies() -> dict[str, bytes]:
+    """The dashboard has no per-request data: render and compress it once."""
+    html = render_template("analytics.html").encode("utf-8")
+    bodies = {"gzip": gzip.compress(html, compresslevel=9), "identity": html}
+    if HAS_BROTLI:
+        bodies["br"] = brotli.compress(html, quality=11)
+    return bodies
+
+
 @app.get("/analytics")
 def analytics_dashboard():
     """Render the analytics dashboard UI."""
-    return render_template_string(r"""
-<!doctype html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8" />
-    <meta name="viewport" content="width=device-width, initial-scale=1" />
-    <title>🌿 Plant Analytics Dashboard</title>
-    <link href="https://fonts.googleapis.com/css2?family=Fira+Code:wght@400;500;600;700&family=Fira+Sans:wght@300;400;500;600;700&display=swap" rel="stylesheet">
-    <script src="https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.min.js"></script>
-    <style>
-        * { box-sizing: border-box; margin: 0; padding: 0; }
-        
-        html { scroll-behavior: smooth; }
-        
-        @media (prefers-reduced-motion: reduce) {
-            *, *::before, *::after {
-                animation-duration: 0.01ms !important;
-                animation-iteration-count: 1 !important;
-                transition-duration: 0.01ms !important;
-            }
-        }
-        
-        :root {
-            /* New Design System Colors */
-            --bg-gradient-1: #0a0e27;
-            --bg-gradient-2: #1a1f3a;
-            --card-bg: rgba(17, 24, 39, 0.8);
-            --card-border: rgba(255, 255, 255, 0.08);
-            --primary: #3b82f6;           /* Blue-500 */
-            --primary-light: #60a5fa;      /* Blue-400 */
-            --secondary: #60a5fa;          /* Blue-400 for secondary actions */
-            --accent: #10b981;             /* Emerald-500 for success */
-            --cta: #f97316;                /* Orange-500 for CTAs */
-            --text: #f1f5f9;               /* Slate-100 */
-            --text-muted: #94a3b8;         /* Slate-400 */
-            --text-dim: #64748b;           /* Slate-500 */
-            --input-bg: rgba(15, 23, 42, 0.6);
-            --input-border: rgba(148, 163, 184, 0.2);
-            --success: #10b981;
-            --warning: #f59e0b;
-            --error: #ef4444;
-            
-            /* Typography */
-            --font-heading: 'Fira Code', monospace;
-            --font-body: 'Fira Sans', sans-serif;
-        }
-        
-        body {
-            font-family: var(--font-body);
-            background: linear-gradient(135deg, var(--bg-gradient-1) 0%, var(--bg-gradient-2) 100%);
-            background-attachment: fixed;
-            color: var(--text);
-            min-height: 100vh;
-            line-height: 1.6;
-            padding: 1.25rem;
-        }
-            --bg-gradient-1: #0a0e27;
-            --bg-gradient-2: #1a1f3a;
-            --card-bg: rgba(17, 24, 39, 0.8);
-            --card-border: rgba(255, 255, 255, 0.08);
-            --primary: #3b82f6;
-            --primary-light: #60a5fa;
-            --secondary: #8b5cf6;
-            --accent: #10b981;
-            --accent-pink: #ec4899;
-            --text: #f1f5f9;
-            --text-muted: #94a3b8;
-            --text-dim: #64748b;
-            --input-bg: rgba(15, 23, 42, 0.6);
-            --input-border: rgba(148, 163, 184, 0.2);
-            --success: #10b981;
-            --warning: #f59e0b;
-            --error: #ef4444;
-        }
-        body {
-            font-family: 'Inter', -apple-system, BlinkMacSystemFont, system-ui, sans-serif;
-            background: linear-gradient(135deg, var(--bg-gradient-1) 0%, var(--bg-gradient-2) 100%);
-            background-attachment: fixed;
-            color: var(--text);
-            min-height: 100vh;
-            line-height: 1.6;
-            padding: 20px;
-        }
-        body::before {
-            content: '';
-            position: fixed;
-            top: 0; left: 0; right: 0; bottom: 0;
-            background:
-                radial-gradient(circle at 20% 20%, rgba(59, 130, 246, 0.15), transparent 40%),
-                radial-gradient(circle at 80% 80%, rgba(139, 92, 246, 0.15), transparent 40%),
-                radial-gradient(circle at 50% 50%, rgba(236, 72, 153, 0.08), transparent 50%);
-            pointer-events: none;
-            z-index: 0;
-        }
-        .container {
-            max-width: 1600px;
-            margin: 0 auto;
-            position: relative;
-            z-index: 1;
-        }
-        .header {
-            text-align: center;
-            margin-bottom: 32px;
-            animation: fadeInDown 0.6s ease;
-        }
-        .header h1 {
-            margin: 0 0 8px;
-            font-size: 2.5rem;
-            font-weight: 800;
-            background: linear-gradient(135deg, #3b82f6, #8b5cf6, #ec4899);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            background-clip: text;
-        }
-        .header p {
-            color: var(--text-muted);
-            font-size: 1rem;
-        }
-        .card {
-            background: var(--card-bg);
-            backdrop-filter: blur(20px);
-            border: 1px solid var(--card-border);
-            border-radius: 20px;
-            padding: 24px;
-            box-shadow: 0 20px 60px rgba(0, 0, 0, 0.4);
-            margin-bottom: 20px;
-            animation: fadeInUp 0.6s ease;
-        }
-        .stats-grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(240px, 1fr));
-            gap: 16px;
-            margin-bottom: 24px;
-        }
-        .stat-card {
-            background: linear-gradient(135deg, rgba(59, 130, 246, 0.1), rgba(139, 92, 246, 0.1));
-            border: 1px solid var(--card-border);
-            border-radius: 16px;
-            padding: 20px;
-            text-align: center;
-            transition: transform 0.3s ease;
-        }
-        .stat-card:hover {
-            transform: translateY(-4px);
-        }
-        .stat-value {
-            font-size: 2rem;
-            font-weight: 700;
-            color: var(--primary-light);
-            margin-bottom: 4px;
-        }
-        .stat-label {
-            font-size: 0.875rem;
-            color: var(--text-muted);
-            font-weight: 500;
-        }
-        .charts-grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(400px, 1fr));
-            gap: 20px;
-            margin-bottom: 24px;
-        }
-        .chart-card {
-            background: var(--card-bg);
-            border: 1px solid var(--card-border);
-            border-radius: 16px;
-            padding: 20px;
-        }
-        .chart-title {
-            font-size: 1rem;
-            font-weight: 600;
-            margin-bottom: 16px;
-            color: var(--text);
-        }
-        .filters {
-            display: flex;
-            gap: 12px;
-            flex-wrap: wrap;
-            margin-bottom: 20px;
-            padding: 16px;
-            background: rgba(15, 23, 42, 0.4);
-            border-radius: 12px;
-        }
-        .filter-group {
-            flex: 1;
-            min-width: 200px;
-        }
-        .filter-group label {
-            display: block;
-            font-size: 0.875rem;
-            font-weight: 600;
-            margin-bottom: 6px;
-            color: var(--text-muted);
-        }
-        .filter-group select,
-        .filter-group input {
-            width: 100%;
-            padding: 10px 14px;
-            background: var(--input-bg);
-            border: 1px solid var(--input-border);
-            border-radius: 8px;
-            color: var(--text);
-            font-size: 0.875rem;
-            font-family: inherit;
-            transition: border-color 0.2s;
-        }
-        .filter-group select:focus,
-        .filter-group input:focus {
-            outline: none;
-            border-color: var(--primary);
-        }
-        .btn {
-            padding: 10px 20px;
-            border: none;
-            border-radius: 8px;
-            font-weight: 600;
-            font-size: 0.875rem;
-            cursor: pointer;
-            transition: all 0.3s ease;
-            font-family: inherit;
-        }
-        .btn-primary {
-            background: linear-gradient(135deg, var(--primary), var(--secondary));
-            color: white;
-        }
-        .btn-primary:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 8px 20px rgba(59, 130, 246, 0.4);
-        }
-        .btn-secondary {
-            background: rgba(148, 163, 184, 0.2);
-            color: var(--text-muted);
-        }
-        .btn-secondary:hover {
-            background: rgba(148, 163, 184, 0.3);
-            color: var(--text);
-        }
-        .table-wrapper {
-            overflow-x: auto;
-            margin-bottom: 16px;
-        }
-        table {
-            width: 100%;
-            border-collapse: collapse;
-        }
-        th {
-            background: rgba(59, 130, 246, 0.1);
-            padding: 12px;
-            text-align: left;
-            font-weight: 600;
-            font-size: 0.875rem;
-            color: var(--text);
-            cursor: pointer;
-            user-select: none;
-            white-space: nowrap;
-        }
-        th:hover {
-            background: rgba(59, 130, 246, 0.2);
-        }
-        td {
-            padding: 12px;
-            border-bottom: 1px solid var(--card-border);
-            font-size: 0.875rem;
-        }
-        tr:hover {
-            background: rgba(59, 130, 246, 0.05);
-            cursor: pointer;
-        }
-        .badge {
-            display: inline-block;
-            padding: 4px 10px;
-            border-radius: 12px;
-            font-size: 0.75rem;
-            font-weight: 600;
-        }
-        .badge-healthy {
-            background: rgba(16, 185, 129, 0.2);
-            color: var(--success);
-        }
-        .badge-unhealthy {
-            background: rgba(239, 68, 68, 0.2);
-            color: var(--error);
-        }
-        .badge-unknown {
-            background: rgba(148, 163, 184, 0.2);
-            color: var(--text-muted);
-        }
-        .badge-identify {
-            background: rgba(59, 130, 246, 0.2);
-            color: var(--primary-light);
-        }
-        .badge-diagnose {
-            background: rgba(236, 72, 153, 0.2);
-            color: var(--accent-pink);
-        }
-        .pagination {
-            display: flex;
-            justify-content: center;
-            align-items: center;
-            gap: 8px;
-            margin-top: 16px;
-        }
-        .page-info {
-            color: var(--text-muted);
-            font-size: 0.875rem;
-            margin: 0 12px;
-        }
-        .img-thumb {
-            width: 50px;
-            height: 50px;
-            object-fit: cover;
-            border-radius: 8px;
-            cursor: pointer;
-            transition: transform 0.2s;
-        }
-        .img-thumb:hover {
-            transform: scale(1.1);
-        }
-        .modal {
-            display: none;
-            position: fixed;
-            top: 0; left: 0; right: 0; bottom: 0;
-            background: rgba(0, 0, 0, 0.8);
-            z-index: 1000;
-            align-items: center;
-            justify-content: center;
-            padding: 20px;
-        }
-        .modal.active {
-            display: flex;
-        }
-        .modal-content {
-            background: var(--card-bg);
-            border: 1px solid var(--card-border);
-            border-radius: 16px;
-            padding: 32px;
-            max-width: 800px;
-            width: 100%;
-            max-height: 90vh;
-            overflow-y: auto;
-            position: relative;
-        }
-        .modal-close {
-            position: absolute;
-            top: 16px;
-            right: 16px;
-            width: 32px;
-            height: 32px;
-            border-radius: 50%;
-            background: rgba(255, 255, 255, 0.1);
-            border: none;
-            color: var(--text);
-            font-size: 1.5rem;
-            cursor: pointer;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-        }
-        .modal-close:hover {
-            background: rgba(255, 255, 255, 0.2);
-        }
-        .modal-img {
-            width: 100%;
-            border-radius: 12px;
-            margin-bottom: 20px;
-        }
-        .detail-row {
-            display: flex;
-            padding: 12px 0;
-            border-bottom: 1px solid var(--card-border);
-        }
-        .detail-label {
-            font-weight: 600;
-            color: var(--text-muted);
-            width: 180px;
-            flex-shrink: 0;
-        }
-        .detail-value {
-            color: var(--text);
-            word-break: break-all;
-        }
-        .loading {
-            text-align: center;
-            padding: 40px;
-            color: var(--text-muted);
-        }
-        .spinner {
-            border: 3px solid rgba(255, 255, 255, 0.1);
-            border-top: 3px solid var(--primary);
-            border-radius: 50%;
-            width: 40px;
-            height: 40px;
-            animation: spin 1s linear infinite;
-            margin: 0 auto 16px;
-        }
-        @keyframes spin {
-            0% { transform: rotate(0deg); }
-            100% { transform: rotate(360deg); }
-        }
-        @keyframes fadeInDown {
-            from {
-                opacity: 0;
-                transform: translateY(-20px);
-            }
-            to {
-                opacity: 1;
-                transform: translateY(0);
-            }
-        }
-        @keyframes fadeInUp {
-            from {
-                opacity: 0;
-                transform: translateY(20px);
-            }
-            to {
-                opacity: 1;
-                transform: translateY(0);
-            }
-        }
-        @media (max-width: 768px) {
-            .header h1 { font-size: 2rem; }
-            .stats-grid { grid-template-columns: repeat(2, 1fr); }
-            .charts-grid { grid-template-columns: 1fr; }
-            .filters { flex-direction: column; }
-            .filter-group { min-width: 100%; }
-            table { font-size: 0.75rem; }
-            th, td { padding: 8px; }
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>🌿 Plant Identification Analytics</h1>
-            <p>Track and analyze plant identification and diagnosis requests</p>
-        </div>
-
-        <!-- Statistics Cards -->
-        <div class="stats-grid">
-            <div class="stat-card">
-                <div class="stat-value" id="totalRequests">0</div>
-                <div class="stat-label">Total Requests</div>
-            </div>
-            <div class="stat-card">
-                <div class="stat-value" id="avgResponseTime">0s</div>
-                <div class="stat-label">Avg Response Time</div>
-            </div>
-            <div class="stat-card">
-                <div class="stat-value" id="successRate">0%</div>
-                <div class="stat-label">Healthy Plants</div>
-            </div>
-            <div class="stat-card">
-                <div class="stat-value" id="uniqueDevices">0</div>
-                <div class="stat-label">Unique Devices</div>
-            </div>
-        </div>
-
-        <!-- Charts -->
-        <div class="charts-grid">
-            <div class="chart-card">
-                <div class="chart-title">Function Distribution</div>
-                <canvas id="functionChart"></canvas>
-            </div>
-            <div class="chart-card">
-                <div class="chart-title">Response Time Trend</div>
-                <canvas id="responseTimeChart"></canvas>
-            </div>
-            <div class="chart-card">
-                <div class="chart-title">Health Status Distribution</div>
-                <canvas id="healthChart"></canvas>
-            </div>
-            <div class="chart-card">
-                <div class="chart-title">Top Countries</div>
-                <canvas id="countryChart"></canvas>
-            </div>
-        </div>
-
-        <!-- Filters & Data Table -->
-        <div class="card">
-            <div class="filters">
-                <div class="filter-group">
-                    <label>Device ID</label>
-                    <select id="filterDevice">
-                        <option value="">All Devices</option>
-                    </select>
-                </div>
-                <div class="filter-group">
-                    <label>Function</label>
-                    <select id="filterFunction">
-                        <option value="">All Functions</option>
-                        <option value="Plant identify">Plant Identify</option>
-                        <option value="Diagnose">Diagnose</option>
-                    </select>
-                </div>
-                <div class="filter-group">
-                    <label>Health Status</label>
-                    <select id="filterHealth">
-                        <option value="">All Status</option>
-                        <option value="true">Healthy</option>
-                        <option value="false">Unhealthy</option>
-                        <option value="null">Unknown</option>
-                    </select>
-                </div>
-                <div class="filter-group">
-                    <label>Date From</label>
-                    <input type="date" id="filterDateFrom">
-                </div>
-                <div class="filter-group">
-                    <label>Date To</label>
-                    <input type="date" id="filterDateTo">
-                </div>
-                <div class="filter-group" style="display: flex; align-items: flex-end; gap: 8px;">
-                    <button class="btn btn-primary" onclick="applyFilters()">Apply</button>
-                    <button class="btn btn-secondary" onclick="clearFilters()">Clear</button>
-                </div>
-            </div>
-
-            <div class="table-wrapper">
-                <table>
-                    <thead>
-                        <tr>
-                            <th onclick="sortTable('date')">Date ↕</th>
-                            <th onclick="sortTable('device_id')">Device ↕</th>
-                            <th onclick="sortTable('function')">Function ↕</th>
-                            <th onclick="sortTable('result')">Result ↕</th>
-                            <th onclick="sortTable('response_time_seconds')">Response Time ↕</th>
-                            <th onclick="sortTable('is_plant_healthy')">Health ↕</th>
-                            <th>Image</th>
-                        </tr>
-                    </thead>
-                    <tbody id="tableBody">
-                        <tr>
-                            <td colspan="7" class="loading">
-                                <div class="spinner"></div>
-                                Loading data...
-                            </td>
-                        </tr>
-                    </tbody>
-                </table>
-            </div>
-
-            <div class="pagination">
-                <button class="btn btn-secondary" onclick="prevPage()" id="prevBtn">Previous</button>
-                <span class="page-info" id="pageInfo">Page 1</span>
-                <button class="btn btn-secondary" onclick="nextPage()" id="nextBtn">Next</button>
-            </div>
-        </div>
-    </div>
-
-    <!-- Detail Modal -->
-    <div class="modal" id="detailModal" onclick="closeModal(event)">
-        <div class="modal-content" onclick="event.stopPropagation()">
-            <button class="modal-close" onclick="closeModal()">×</button>
-            <div id="detailContent"></div>
-        </div>
-    </div>
-
-    <script>
-        let allData = [];
-        let filteredData = [];
-        let currentPage = 1;
-        const itemsPerPage = 20;
-        let sortColumn = 'date';
-        let sortDirection = -1; // -1 for desc, 1 for asc
-        let charts = {};
-
-        // Fetch data on load
-        fetchData();
-
-        async function fetchData() {
-            try {
-                const response = await fetch('/api/analytics/proxy');
-                const json = await response.json();
-                allData = json.data || [];
-                filteredData = [...allData];
-                updateUI();
-            } catch (error) {
-                console.error('Error fetching data:', error);
-                document.getElementById('tableBody').innerHTML = 
-                    '<tr><td colspan="7" style="text-align:center;color:var(--error);">Error loading data. Please try again.</td></tr>';
-            }
-        }
-
-        function updateUI() {
-            updateStats();
-            updateCharts();
-            updateTable();
-            updateFilters();
-        }
-
-        function updateStats() {
-            const total = filteredData.length;
-            const avgTime = filteredData.filter(d => d.response_time_seconds).reduce((sum, d) => 
-                sum + d.response_time_seconds, 0) / (filteredData.filter(d => d.response_time_seconds).length || 1);
-            const healthyCount = filteredData.filter(d => d.is_plant_healthy === true).length;
-            const uniqueDevices = new Set(filteredData.map(d => d.device_id)).size;
-
-            document.getElementById('totalRequests').textContent = total;
-            document.getElementById('avgResponseTime').textContent = avgTime.toFixed(2) + 's';
-            document.getElementById('successRate').textContent = 
-                total > 0 ? ((healthyCount / total) * 100).toFixed(1) + '%' : '0%';
-            document.getElementById('uniqueDevices').textContent = uniqueDevices;
-        }
-
-        function updateCharts() {
-            // Function distribution
-            const functionCounts = {};
-            filteredData.forEach(d => {
-                functionCounts[d.function] = (functionCounts[d.function] || 0) + 1;
-            });
-
-            if (charts.functionChart) charts.functionChart.destroy();
-            charts.functionChart = new Chart(document.getElementById('functionChart'), {
-                type: 'doughnut',
-                data: {
-                    labels: Object.keys(functionCounts),
-                    datasets: [{
-                        data: Object.values(functionCounts),
-                        backgroundColor: ['rgba(59, 130, 246, 0.8)', 'rgba(236, 72, 153, 0.8)', 'rgba(16, 185, 129, 0.8)']
-                    }]
-                },
-                options: {
-                    responsive: true,
-                    plugins: {
-                        legend: { labels: { color: '#f1f5f9' } }
-                    }
-                }
-            });
-
-            // Response time trend (last 20)
-            const recentData = filteredData.filter(d => d.response_time_seconds).slice(0, 20).reverse();
-            if (charts.responseTimeChart) charts.responseTimeChart.destroy();
-            charts.responseTimeChart = new Chart(document.getElementById('responseTimeChart'), {
-                type: 'line',
-                data: {
-                    labels: recentData.map((_, i) => i + 1),
-                    datasets: [{
-                        label: 'Response Time (s)',
-                        data: recentData.map(d => d.response_time_seconds),
-                        borderColor: 'rgba(59, 130, 246, 1)',
-                        backgroundColor: 'rgba(59, 130, 246, 0.1)',
-                        tension: 0.4
-                    }]
-                },
-                options: {
-                    responsive: true,
-                    scales: {
-                        y: { ticks: { color: '#94a3b8' }, grid: { color: 'rgba(255,255,255,0.1)' } },
-                        x: { ticks: { color: '#94a3b8' }, grid: { color: 'rgba(255,255,255,0.1)' } }
-                    },
-                    plugins: {
-                        legend: { labels: { color: '#f1f5f9' } }
-                    }
-                }
-            });
-
-            // Health status
-            const healthCounts = {
-                'Healthy': filteredData.filter(d => d.is_plant_healthy === true).length,
-                'Unhealthy': filteredData.filter(d => d.is_plant_healthy === false).length,
-                'Unknown': filteredData.filter(d => d.is_plant_healthy === null).length
-            };
-            if (charts.healthChart) charts.healthChart.destroy();
-            charts.healthChart = new Chart(document.getElementById('healthChart'), {
-                type: 'bar',
-                data: {
-                    labels: Object.keys(healthCounts),
-                    datasets: [{
-                        label: 'Count',
-                        data: Object.values(healthCounts),
-                        backgroundColor: ['rgba(16, 185, 129, 0.8)', 'rgba(239, 68, 68, 0.8)', 'rgba(148, 163, 184, 0.8)']
-                    }]
-                },
-                options: {
-                    responsive: true,
-                    scales: {
-                        y: { ticks: { color: '#94a3b8' }, grid: { color: 'rgba(255,255,255,0.1)' } },
-                        x: { ticks: { color: '#94a3b8' }, grid: { color: 'rgba(255,255,255,0.1)' } }
-                    },
-                    plugins: {
-                        legend: { display: false }
-                    }
-                }
-            });
-
-            // Country distribution
-            const countryCounts = {};
-            filteredData.forEach(d => {
-                const country = d.country_code || 'unknown';
-                countryCounts[country] = (countryCounts[country] || 0) + 1;
-            });
-            const topCountries = Object.entries(countryCounts)
-                .sort((a, b) => b[1] - a[1])
-                .slice(0, 10);
-            
-            if (charts.countryChart) charts.countryChart.destroy();
-            charts.countryChart = new Chart(document.getElementById('countryChart'), {
-                type: 'bar',
-                data: {
-                    labels: topCountries.map(c => c[0]),
-                    datasets: [{
-                        label: 'Requests',
-                        data: topCountries.map(c => c[1]),
-                        backgroundColor: 'rgba(139, 92, 246, 0.8)'
-                    }]
-                },
-                options: {
-                    responsive: true,
-                    indexAxis: 'y',
-                    scales: {
-                        y: { ticks: { color: '#94a3b8' }, grid: { color: 'rgba(255,255,255,0.1)' } },
-                        x: { ticks: { color: '#94a3b8' }, grid: { color: 'rgba(255,255,255,0.1)' } }
-                    },
-                    plugins: {
-                        legend: { display: false }
-                    }
-                }
-            });
-        }
-
-        function updateTable() {
-            // Sort data
-            const sorted = [...filteredData].sort((a, b) => {
-                let aVal = a[sortColumn];
-                let bVal = b[sortColumn];
-                if (aVal == null) aVal = '';
-                if (bVal == null) bVal = '';
-                return sortDirection * (aVal > bVal ? 1 : aVal < bVal ? -1 : 0);
-            });
-
-            // Paginate
-            const start = (currentPage - 1) * itemsPerPage;
-            const end = start + itemsPerPage;
-            const pageData = sorted.slice(start, end);
-
-            // Render table
-            const tbody = document.getElementById('tableBody');
-            if (pageData.length === 0) {
-                tbody.innerHTML = '<tr><td colspan="7" style="text-align:center;color:var(--text-muted);">No data found</td></tr>';
-            } else {
-                tbody.innerHTML = pageData.map((row, idx) => {
-                    const date = new Date(row.date).toLocaleString();
-                    const health = row.is_plant_healthy === true ? '<span class="badge badge-healthy">Healthy</span>' :
-                                   row.is_plant_healthy === false ? '<span class="badge badge-unhealthy">Unhealthy</span>' :
-                                   '<span class="badge badge-unknown">Unknown</span>';
-                    const func = row.function === 'Plant identify' ? '<span class="badge badge-identify">Identify</span>' :
-                                 '<span class="badge badge-diagnose">Diagnose</span>';
-                    const img = row.image_url ? 
-                        `<img src="${row.image_url}" class="img-thumb" onclick="showImage('${row.image_url}', event)" />` :
-                        '<span style="color:var(--text-dim);">-</span>';
-                    const responseTime = row.response_time_seconds ? row.response_time_seconds.toFixed(2) + 's' : '-';
-                    const result = row.result || '-';
-
-                    return `<tr onclick="showDetail(${start + idx})">
-                        <td>${date}</td>
-                        <td>${row.device_id}</td>
-                        <td>${func}</td>
-                        <td>${result}</td>
-                        <td>${responseTime}</td>
-                        <td>${health}</td>
-                        <td>${img}</td>
-                    </tr>`;
-                }).join('');
-            }
-
-            // Update pagination
-            const totalPages = Math.ceil(sorted.length / itemsPerPage) || 1;
-            document.getElementById('pageInfo').textContent = `Page ${currentPage} of ${totalPages}`;
-            document.getElementById('prevBtn').disabled = currentPage === 1;
-            document.getElementById('nextBtn').disabled = currentPage >= totalPages;
-        }
-
-        function updateFilters() {
-            // Populate device filter
-            const devices = [...new Set(allData.map(d => d.device_id))].sort();
-            const deviceSelect = document.getElementById('filterDevice');
-            const currentDevice = deviceSelect.value;
-            deviceSelect.innerHTML = '<option value="">All Devices</option>' +
-                devices.map(d => `<option value="${d}" ${d === currentDevice ? 'selected' : ''}>${d}</option>`).join('');
-        }
-
-        function applyFilters() {
-            const device = document.getElementById('filterDevice').value;
-            const func = document.getElementById('filterFunction').value;
-            const health = document.getElementById('filterHealth').value;
-            const dateFrom = document.getElementById('filterDateFrom').value;
-            const dateTo = document.getElementById('filterDateTo').value;
-
-            filteredData = allData.filter(row => {
-                if (device && row.device_id !== device) return false;
-                if (func && row.function !== func) return false;
-                if (health !== '' && String(row.is_plant_healthy) !== health) return false;
-                if (dateFrom && new Date(row.date) < new Date(dateFrom)) return false;
-                if (dateTo && new Date(row.date) > new Date(dateTo + 'T23:59:59')) return false;
-                return true;
-            });
-
-            currentPage = 1;
-            updateUI();
-        }
-
-        function clearFilters() {
-            document.getElementById('filterDevice').value = '';
-            document.getElementById('filterFunction').value = '';
-            document.getElementById('filterHealth').value = '';
-            document.getElementById('filterDateFrom').value = '';
-            document.getElementById('filterDateTo').value = '';
-            filteredData = [...allData];
-            currentPage = 1;
-            updateUI();
-        }
-
-        function sortTable(column) {
-            if (sortColumn === column) {
-                sortDirection *= -1;
-            } else {
-                sortColumn = column;
-                sortDirection = -1;
-            }
-            updateTable();
-        }
-
-        function prevPage() {
-            if (currentPage > 1) {
-                currentPage--;
-                updateTable();
-            }
-        }
-
-        function nextPage() {
-            const totalPages = Math.ceil(filteredData.length / itemsPerPage);
-            if (currentPage < totalPages) {
-                currentPage++;
-                updateTable();
-            }
-        }
-
-        function showDetail(index) {
-            const row = filteredData.sort((a, b) => {
-                let aVal = a[sortColumn] || '';
-                let bVal = b[sortColumn] || '';
-                return sortDirection * (aVal > bVal ? 1 : aVal < bVal ? -1 : 0);
-            })[(currentPage - 1) * itemsPerPage + index];
-
-            const img = row.image_url ? `<img src="${row.image_url}" class="modal-img" />` : '';
-            const health = row.is_plant_healthy === true ? 'Healthy' :
-                           row.is_plant_healthy === false ? 'Unhealthy' : 'Unknown';
-
-            document.getElementById('detailContent').innerHTML = `
-                ${img}
-                <div class="detail-row">
-                    <div class="detail-label">Date</div>
-                    <div class="detail-value">${new Date(row.date).toLocaleString()}</div>
-                </div>
-                <div class="detail-row">
-                    <div class="detail-label">Device ID</div>
-                    <div class="detail-value">${row.device_id}</div>
-                </div>
-                <div class="detail-row">
-                    <div class="detail-label">Country</div>
-                    <div class="detail-value">${row.country_code || 'Unknown'}</div>
-                </div>
-                <div class="detail-row">
-                    <div class="detail-label">App Version</div>
-                    <div class="detail-value">${row.app_version || 'Unknown'}</div>
-                </div>
-                <div class="detail-row">
-                    <div class="detail-label">Function</div>
-                    <div class="detail-value">${row.function}</div>
-                </div>
-                <div class="detail-row">
-                    <div class="detail-label">Result</div>
-                    <div class="detail-value">${row.result || '-'}</div>
-                </div>
-                <div class="detail-row">
-                    <div class="detail-label">Response Time</div>
-                    <div class="detail-value">${row.response_time_seconds ? row.response_time_seconds.toFixed(3) + 's' : 'N/A'}</div>
-                </div>
-                <div class="detail-row">
-                    <div class="detail-label">Health Status</div>
-                    <div class="detail-value">${health}</div>
-                </div>
-                <div class="detail-row">
-                    <div class="detail-label">Image URL</div>
-                    <div class="detail-value">${row.image_url || 'N/A'}</div>
-                </div>
-            `;
-            document.getElementById('detailModal').classList.add('active');
-        }
-
-        function showImage(url, event) {
-            event.stopPropagation();
-            document.getElementById('detailContent').innerHTML = `<img src="${url}" class="modal-img" />`;
-            document.getElementById('detailModal').classList.add('active');
-        }
-
-        function closeModal(event) {
-            if (!event || event.target.id === 'detailModal' || event.target.classList.contains('modal-close')) {
-                document.getElementById('detailModal').classList.remove('active');
-            }
-        }
-    </script>
-</body>
-</html>
-    """)
+    bodies = _analytics_page_bodies()
+    encoding = next(
+        (enc for enc in ("br", "gzip") if enc in bodies and request.accept_encodings[enc]),
+        "identity",
+    )
+    response = Response(bodies[encoding], mimetype="text/html")
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding"
+    response.cache_control.public = True
+    response.cache_control.max_age = 3600
+    return response
 
 
 @app.get("/api/analytics/proxy")
@@ -3925,7 +4342,6 @@ def _convert_audio_to_ogg(
     """
     if output_path is None:
         output_path = OUTPUT_DIR / f"{uuid.uuid4().hex}.ogg"
-    output_path.parent.mkdir(parents=True, exist_ok=True)
     
     cmd: list[str] = [FFMPEG_PATH, "-y", "-i", str(input_path)]
     
@@ -3943,10 +4359,35 @@ def _convert_audio_to_ogg(
     return output_path
 
 
+def _convert_audio_batch_to_ogg(
+    jobs: list[tuple[Path, Path]],
+    *,
+    bitrate: int = 128,
+    sample_rate: int | None = None,
+) -> None:
+    """Convert several audio files to OGG (Vorbis) with a single FFmpeg process.
+
+    Every ``(input_path, output_path)`` pair becomes one input and one mapped
+    output of the same command, so a batch pays one process start-up instead
+    of one per file. Any failing input fails the whole command.
+    """
+    cmd: list[str] = [FFMPEG_PATH, "-y"]
+    for input_path, _ in jobs:
+        cmd += ["-i", str(input_path)]
+    for index, (_, output_path) in enumerate(jobs):
+        # Tags and chapters default to the first input for every output.
+        cmd += ["-map", f"{index}:a:0", "-map_metadata", str(index), "-map_chapters", str(index)]
+        cmd += ["-c:a", "libvorbis", "-b:a", f"{bitrate}k"]
+        if sample_rate is not None:
+            cmd += ["-ar", str(sample_rate)]
+        cmd.append(str(output_path))
+    _run_ffmpeg(cmd)
+
+
 @app.post("/audio-to-ogg")
 def audio_to_ogg():
     """Convert a single audio file to OGG (Vorbis) format."""
-    file = request.files.get("file")
+    file = _single_upload()
     if file is None or file.filename == "":
         abort(400, "Thiếu file audio")
     
@@ -3955,19 +4396,19 @@ def audio_to_ogg():
         abort(400, "Định dạng không được hỗ trợ. Hỗ trợ: MP3, WAV, AAC, FLAC, M4A, OGG, WMA, OPUS")
     
     # Optional bitrate (default 128 kbps)
-    bitrate_raw = request.form.get("bitrate")
+    bitrate_raw = request.values.get("bitrate")
     bitrate: int = 128
     if bitrate_raw not in (None, "", "0"):
         bitrate = _validate_positive_int(bitrate_raw, name="Bitrate", min_value=32, max_value=320)
     
     # Optional sample rate
-    sample_rate_raw = request.form.get("sample_rate")
+    sample_rate_raw = request.values.get("sample_rate")
     sample_rate: int | None = None
     if sample_rate_raw not in (None, "", "0"):
         sample_rate = _validate_positive_int(sample_rate_raw, name="Sample Rate", min_value=8000, max_value=96000)
     
     input_path = UPLOAD_DIR / f"{uuid.uuid4().hex}{suffix}"
-    file.save(input_path)
+    _save_upload(file, input_path)
     
     try:
         output_path = _convert_audio_to_ogg(
@@ -3985,10 +4426,9 @@ def audio_to_ogg():
         output_path.unlink(missing_ok=True)
         return response
     
-    return send_file(
+    return _send_output(
         output_path,
         mimetype="audio/ogg",
-        as_attachment=True,
         download_name=Path(file.filename).stem + ".ogg",
     )
 
@@ -4017,7 +4457,7 @@ def batch_audio_to_ogg_zip():
     if sample_rate_raw not in (None, "", "0"):
         sample_rate = _validate_positive_int(sample_rate_raw, name="Sample Rate", min_value=8000, max_value=96000)
     
-    batch_dir = OUTPUT_DIR / f"audio_ogg_{uuid.uuid4().hex}"
+    batch_dir = SCRATCH_DIR / f"audio_ogg_{_scratch_id()}"
     batch_dir.mkdir(parents=True, exist_ok=True)
     zip_path = batch_dir / "converted_ogg.zip"
     
@@ -4027,12 +4467,9 @@ def batch_audio_to_ogg_zip():
     successful_files: list[str] = []
     output_paths: list[Path] = []
     
-    def process_audio_file(input_path: Path, original_name: str, index: int) -> Path | None:
+    def process_audio_file(input_path: Path, original_name: str, output_path: Path) -> Path | None:
         """Process a single audio file and return output path or None if failed."""
         try:
-            output_name = _safe_zip_entry_name_with_ext(Path(original_name).stem, index=index, ext=".ogg")
-            output_path = batch_dir / output_name
-            
             _convert_audio_to_ogg(
                 input_path,
                 bitrate=bitrate,
@@ -4050,18 +4487,19 @@ def batch_audio_to_ogg_zip():
             return None
     
     file_index = 0
+    jobs: list[tuple[Path, str, int]] = []
     
     try:
         for f in files:
             if f.filename is None or f.filename == "":
                 continue
             
-            suffix = Path(f.filename).suffix.lower()
+            suffix = _suffix_lower(f.filename)
             
             if suffix == ".zip":
                 # Handle ZIP file - extract and process audio contents
                 zip_input = batch_dir / f"input_{uuid.uuid4().hex}.zip"
-                f.save(zip_input)
+                _save_upload(f, zip_input)
                 
                 extract_dir = batch_dir / f"extract_{uuid.uuid4().hex}"
                 extract_dir.mkdir(parents=True, exist_ok=True)
@@ -4071,7 +4509,7 @@ def batch_audio_to_ogg_zip():
                         for member in zf.namelist():
                             if member.endswith("/"):  # Skip directories
                                 continue
-                            member_suffix = Path(member).suffix.lower()
+                            member_suffix = _suffix_lower(member)
                             if member_suffix not in SUPPORTED_EXTENSIONS:
                                 failed_files.append({
                                     "file": Path(member).name,
@@ -4080,37 +4518,69 @@ def batch_audio_to_ogg_zip():
                                 continue
                             
                             # Extract file
-                            extracted = extract_dir / Path(member).name
+                            file_index += 1
+                            extracted = extract_dir / f"input_{file_index:04d}{member_suffix}"
                             with zf.open(member) as src, open(extracted, "wb") as dst:
                                 dst.write(src.read())
-                            
-                            file_index += 1
-                            result = process_audio_file(extracted, Path(member).name, file_index)
-                            if result:
-                                output_paths.append(result)
-                            extracted.unlink(missing_ok=True)
+                            jobs.append((extracted, Path(member).name, file_index))
                 except zipfile.BadZipFile:
                     failed_files.append({"file": f.filename, "error": "File ZIP không hợp lệ hoặc bị hỏng"})
                 finally:
-                    shutil.rmtree(extract_dir, ignore_errors=True)
                     zip_input.unlink(missing_ok=True)
             
             elif suffix in SUPPORTED_EXTENSIONS:
                 # Direct audio file processing
-                input_path = batch_dir / f"input_{uuid.uuid4().hex}{suffix}"
-                f.save(input_path)
-                
                 file_index += 1
-                result = process_audio_file(input_path, f.filename, file_index)
-                if result:
-                    output_paths.append(result)
-                input_path.unlink(missing_ok=True)
+                input_path = batch_dir / f"input_{file_index:04d}{suffix}"
+                _save_upload(f, input_path)
+                jobs.append((input_path, f.filename, file_index))
             else:
                 failed_files.append({
                     "file": f.filename,
                     "error": f"Định dạng không được hỗ trợ: {suffix}. Hỗ trợ: MP3, WAV, AAC, FLAC, M4A, OGG, WMA, OPUS"
                 })
         
+        # "one.mp3" and "one.wav" both become "one.ogg"; give each its own file.
+        entry_names: set[str] = set()
+        output_for = {
+            index: batch_dir / _unique_zip_entry_name(
+                _safe_zip_entry_name_with_ext(_stem(original_name), index=index, ext=".ogg"),
+                entry_names,
+            )
+            for _, original_name, index in jobs
+        }
+
+        # Convert in groups of AUDIO_BATCH_INPUTS inputs per ffmpeg process.
+        for start in range(0, len(jobs), AUDIO_BATCH_INPUTS):
+            group = [
+                (input_path, original_name, output_for[index])
+                for input_path, original_name, index in jobs[start:start + AUDIO_BATCH_INPUTS]
+            ]
+            converted = False
+            if len(group) > 1:
+                try:
+                    _convert_audio_batch_to_ogg(
+                        [(input_path, output_path) for input_path, _, output_path in group],
+                        bitrate=bitrate,
+                        sample_rate=sample_rate,
+                    )
+                    converted = True
+                except Exception:
+                    # One bad input fails the whole command; redo the group file
+                    # by file so the others still convert and failures are reported.
+                    pass
+            if converted:
+                for _, original_name, output_path in group:
+                    successful_files.append(original_name)
+                    output_paths.append(output_path)
+            else:
+                for input_path, original_name, output_path in group:
+                    result = process_audio_file(input_path, original_name, output_path)
+                    if result:
+                        output_paths.append(result)
+            for input_path, _, _ in group:
+                input_path.unlink(missing_ok=True)
+        
         if not output_paths:
             # All files failed - return error with details
             error_response = {
@@ -4123,10 +4593,12 @@ def batch_audio_to_ogg_zip():
             shutil.rmtree(batch_dir, ignore_errors=True)
             return jsonify(error_response), 400
         
-        # Create output ZIP
-        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        # Vorbis is already entropy-coded; deflating it again only burns CPU.
+        size_hint = sum(path.stat().st_size + 512 for path in output_paths)
+        with _preallocated_zip(zip_path, size_hint) as zf:
             for output_path in output_paths:
-                zf.write(output_path, arcname=output_path.name)
+                _zip_write_file(zf, output_path, output_path.name)
+                output_path.unlink(missing_ok=True)
     
     except HTTPException:
         shutil.rmtree(batch_dir, ignore_errors=True)
@@ -4137,9 +4609,7 @@ def batch_audio_to_ogg_zip():
     
     # If there are failed files, return JSON with download info
     if failed_files:
-        zip_id = uuid.uuid4().hex
-        final_zip_path = OUTPUT_DIR / f"audio_ogg_{zip_id}.zip"
-        shutil.copy(zip_path, final_zip_path)
+        zip_id = _park_zip(zip_path, "audio_ogg_")
         shutil.rmtree(batch_dir, ignore_errors=True)
         
         response_data = {
@@ -4156,13 +4626,12 @@ def batch_audio_to_ogg_zip():
     
     @after_this_request
     def cleanup(response):
-        shutil.rmtree(batch_dir, ignore_errors=True)
+        _remove_tree_later(batch_dir)
         return response
     
-    return send_file(
+    return _send_output(
         zip_path,
         mimetype="application/zip",
-        as_attachment=True,
         download_name=f"audio_ogg_{len(output_paths)}.zip",
     )
 
@@ -4174,23 +4643,13 @@ def download_audio_ogg(zip_id: str):
     if not zip_id or not all(c in '0123456789abcdef' for c in zip_id.lower()):
         abort(400, "ID không hợp lệ")
     
-    zip_path = OUTPUT_DIR / f"audio_ogg_{zip_id}.zip"
-    if not zip_path.exists():
-        abort(404, "File không tồn tại hoặc đã hết hạn")
-    
-    @after_this_request
-    def cleanup(response):
-        zip_path.unlink(missing_ok=True)
-        return response
-    
-    return send_file(
-        zip_path,
-        mimetype="application/zip",
-        as_attachment=True,
-        download_name=f"audio_ogg.zip",
+    return _send_parked_zip(
+        OUTPUT_DIR / f"audio_ogg_{zip_id}.zip", download_name="audio_ogg.zip"
     )
 
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5001, debug=True)
+    # Development server only; production runs gunicorn (see gunicorn.conf.py).
+    # The debugger and reloader are opt-in with FLASK_DEBUG=1.
+    app.run(host="0.0.0.0", port=5001, debug=_parse_bool(os.environ.get("FLASK_DEBUG", "0")))
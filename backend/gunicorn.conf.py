@@ -0,0 +1,17 @@
+"""Gunicorn settings shared by the Docker image and render.yaml.
+
+Conversions block a thread for as long as ffmpeg runs, so requests are spread
+over several processes, each with a pool of threads (which also keeps idle
+keep-alive connections cheap). WEB_CONCURRENCY overrides the process count.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "0")) or max(2, (os.cpu_count() or 2) // 2)
+# Worker processes inherit this, so app.py can split the cores between them.
+os.environ["WEB_CONCURRENCY"] = str(workers)
+worker_class = "gthread"
+threads = 16
+keepalive = 75
+timeout = 120
@@ -254,7 +254,7 @@ export default function AiTrackingPage() {
                                                                     <div className="flex gap-2 flex-wrap">
                                                                         {outputParsed.images.map((img: any, i: number) => (
                                                                             <a key={i} href={img.imageUrl} target="_blank" rel="noopener noreferrer" className="block relative w-12 h-12 rounded-md overflow-hidden border border-slate-700 hover:border-blue-500 transition-colors">
-                                                                                <img src={img.imageUrl} alt="Result" className="w-full h-full object-cover" />
+                                                                                <img src={img.imageUrl} alt="Result" loading="lazy" decoding="async" className="w-full h-full object-cover" />
                                                                             </a>
                                                                         ))}
                                                                     </div>
@@ -291,6 +291,7 @@ export default function ChatTrackingPage() {
       document.body.appendChild(link);
       link.click();
       document.body.removeChild(link);
+      URL.revokeObjectURL(url);
     } catch (err: any) {
       console.error('Export error:', err);
       alert('Export failed: ' + err.message);
@@ -7,13 +7,21 @@ import {
   ArrowLeft,
   CheckCircle2,
   Download,
+  FolderOpen,
   Loader2,
   Package,
   Sparkles,
   Wand2,
 } from "lucide-react";
 import { apiClient } from "@/lib/api-client";
-import { downloadBlob, formatBytes } from "@/lib/file-utils";
+import {
+  downloadBlob,
+  formatBytes,
+  iterateDirectoryFiles,
+  openDirectoryFileStream,
+  openZipSaveStream,
+  pickDirectory,
+} from "@/lib/file-utils";
 
 const StatusNotice = ({ status }: { status: string }) => {
   if (!status) return null;
@@ -60,6 +68,8 @@ const summarizeFiles = (files: File[]) => {
   return `${files.length} files · ${formatBytes(totalBytes)}`;
 };
 
+const IMAGE_ZIP_EXTENSIONS = [".png", ".jpg", ".jpeg"];
+
 const parseOptionalNumber = (value: string) => {
   const parsed = Number(value);
   if (!Number.isFinite(parsed) || parsed <= 0) return undefined;
@@ -85,6 +95,7 @@ export default function BatchPage() {
   const [tgsWidth, setTgsWidth] = useState("");
   const [tgsQuality, setTgsQuality] = useState("");
   const [tgsFps, setTgsFps] = useState("");
+  const [tgsFormat, setTgsFormat] = useState<"gif" | "webp">("gif");
   const [tgsStatus, setTgsStatus] = useState("");
   const [tgsProcessing, setTgsProcessing] = useState(false);
 
@@ -145,15 +156,15 @@ export default function BatchPage() {
     [toTgsFiles]
   );
 
-  const handleImagesZip = async () => {
-    if (!imagesZipFiles.length) {
-      setImagesZipStatus("error:Vui lòng chọn ảnh.");
-      return;
-    }
+  const runImagesZip = async (
+    source: File[] | AsyncIterable<File>,
+    output: WritableStream | null,
+    processingMessage: string
+  ) => {
     try {
       setImagesZipProcessing(true);
-      setImagesZipStatus("processing:Đang chuyển ảnh sang WebP...");
-      const result = await apiClient.imagesToWebPZip(imagesZipFiles);
+      setImagesZipStatus(`processing:${processingMessage}`);
+      const result = await apiClient.imagesToWebPZip(source, output);
 
       if (!result.success) {
         const failedInfo = result.failedFiles
@@ -192,6 +203,49 @@ export default function BatchPage() {
     }
   };
 
+  const handleImagesZip = async () => {
+    if (!imagesZipFiles.length) {
+      setImagesZipStatus("error:Vui lòng chọn ảnh.");
+      return;
+    }
+    let output: WritableStream | null;
+    try {
+      // Stream the archive straight to disk where the browser allows it.
+      output = await openZipSaveStream("images_webp.zip");
+    } catch {
+      return; // save dialog dismissed
+    }
+    await runImagesZip(imagesZipFiles, output, "Đang chuyển ảnh sang WebP...");
+  };
+
+  const handleImagesZipFolder = async () => {
+    let directory: FileSystemDirectoryHandle | null;
+    try {
+      directory = await pickDirectory("readwrite");
+    } catch {
+      return; // folder dialog dismissed
+    }
+    if (!directory) {
+      setImagesZipStatus("error:Trình duyệt không hỗ trợ chọn thư mục.");
+      return;
+    }
+    // The archive is written into the picked folder as it grows, so a giant
+    // batch never sits in memory; a .zip is not an input, so it is not re-read.
+    let output: WritableStream | null;
+    try {
+      output = await openDirectoryFileStream(directory, "images_webp.zip");
+    } catch {
+      output = null; // fall back to building the ZIP in memory and downloading it
+    }
+    // Files are read from the folder one at a time as conversion slots free
+    // up, so huge folders never sit in memory as one File array.
+    await runImagesZip(
+      iterateDirectoryFiles(directory, IMAGE_ZIP_EXTENSIONS),
+      output,
+      `Đang chuyển ảnh trong thư mục ${directory.name}...`
+    );
+  };
+
   const handleConvertZip = async () => {
     if (!convertZipFiles.length) {
       setConvertZipStatus("error:Vui lòng chọn ảnh.");
@@ -227,14 +281,16 @@ export default function BatchPage() {
     }
     try {
       setTgsProcessing(true);
-      setTgsStatus("processing:Đang chuyển TGS → GIF...");
+      const label = tgsFormat === "webp" ? "WebP" : "GIF";
+      setTgsStatus(`processing:Đang chuyển TGS → ${label}...`);
       const blob = await apiClient.tgsToGifZip(tgsFiles, {
         width: parseOptionalNumber(tgsWidth),
         quality: parseOptionalNumber(tgsQuality),
         fps: parseOptionalNumber(tgsFps),
+        format: tgsFormat,
       });
-      downloadBlob(blob, `tgs_to_gif_${tgsFiles.length}.zip`);
-      setTgsStatus("success:ZIP GIF đã sẵn sàng.");
+      downloadBlob(blob, `tgs_to_${tgsFormat}_${tgsFiles.length}.zip`);
+      setTgsStatus(`success:ZIP ${label} đã sẵn sàng.`);
     } catch (error) {
       setTgsStatus(
         `error:${error instanceof Error ? error.message : "Có lỗi xảy ra"}`
@@ -446,6 +502,14 @@ export default function BatchPage() {
               )}
               Tạo ZIP WebP
             </button>
+            <button
+              onClick={handleImagesZipFolder}
+              disabled={imagesZipProcessing}
+              className="mt-3 flex w-full items-center justify-center gap-2 rounded-2xl border border-[var(--border)] bg-[var(--secondary)] px-4 py-3 text-sm font-semibold text-[var(--foreground)] transition hover:border-sky-400/50 disabled:cursor-not-allowed disabled:opacity-50 cursor-pointer"
+            >
+              <FolderOpen className="h-4 w-4" />
+              Chọn thư mục
+            </button>
             <div className="mt-4">
               <StatusNotice status={imagesZipStatus} />
             </div>
@@ -592,7 +656,22 @@ export default function BatchPage() {
               <div className="text-xs text-[var(--muted)]">{tgsSummary}</div>
             </div>
 
-            <div className="mt-5 grid gap-4 md:grid-cols-3">
+            <div className="mt-5 grid gap-4 md:grid-cols-4">
+              <div>
+                <label className="text-xs font-semibold uppercase tracking-widest text-[var(--muted)]">
+                  Format
+                </label>
+                <select
+                  value={tgsFormat}
+                  onChange={(event) =>
+                    setTgsFormat(event.target.value as "gif" | "webp")
+                  }
+                  className="input mt-2 cursor-pointer"
+                >
+                  <option value="gif">GIF</option>
+                  <option value="webp">WebP (nhẹ hơn)</option>
+                </select>
+              </div>
               <div>
                 <label className="text-xs font-semibold uppercase tracking-widest text-[var(--muted)]">
                   Width
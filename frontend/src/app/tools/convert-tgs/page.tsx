@@ -6,8 +6,12 @@ import {
     AlertCircle,
     ArrowLeft,
     CheckCircle2,
+    Clapperboard,
     Download,
     FileArchive,
+    FileJson,
+    Film,
+    Image as ImageIcon,
     Loader2,
     Sparkles,
     Upload,
@@ -58,11 +62,10 @@ const StatusNotice = ({ status }: { status: string }) => {
 
 const getFileIcon = (filename: string) => {
     const ext = filename.toLowerCase().split(".").pop();
-    if (ext === "json") return "📄";
-    if (ext === "gif") return "🎞️";
-    if (ext === "webm") return "🎬";
-    if (ext === "webp") return "🖼️";
-    return "🖼️";
+    if (ext === "json") return FileJson;
+    if (ext === "gif") return Film;
+    if (ext === "webm") return Clapperboard;
+    return ImageIcon;
 };
 
 export default function ConvertToTgsPage() {
@@ -248,30 +251,33 @@ export default function ConvertToTgsPage() {
                                 </button>
                             </div>
                             <div className="mt-3 max-h-60 space-y-2 overflow-y-auto">
-                                {files.map((file, index) => (
-                                    <div
-                                        key={`${file.name}-${index}`}
-                                        className="flex items-center justify-between rounded-xl bg-slate-50 px-4 py-2"
-                                    >
-                                        <div className="flex items-center gap-3">
-                                            <span className="text-xl">{getFileIcon(file.name)}</span>
-                                            <div>
-                                                <p className="text-sm font-medium text-slate-700 truncate max-w-xs">
-                                                    {file.name}
-                                                </p>
-                                                <p className="text-xs text-slate-500">
-                                                    {formatBytes(file.size)}
-                                                </p>
+                                {files.map((file, index) => {
+                                    const FileIcon = getFileIcon(file.name);
+                                    return (
+                                        <div
+                                            key={`${file.name}-${index}`}
+                                            className="flex items-center justify-between rounded-xl bg-slate-50 px-4 py-2"
+                                        >
+                                            <div className="flex items-center gap-3">
+                                                <FileIcon className="h-5 w-5 text-slate-500" />
+                                                <div>
+                                                    <p className="text-sm font-medium text-slate-700 truncate max-w-xs">
+                                                        {file.name}
+                                                    </p>
+                                                    <p className="text-xs text-slate-500">
+                                                        {formatBytes(file.size)}
+                                                    </p>
+                                                </div>
                                             </div>
+                                            <button
+                                                onClick={() => removeFile(index)}
+                                                className="rounded-full p-1 text-slate-400 hover:bg-slate-200 hover:text-slate-600"
+                                            >
+                                                <X className="h-4 w-4" />
+                                            </button>
                                         </div>
-                                        <button
-                                            onClick={() => removeFile(index)}
-                                            className="rounded-full p-1 text-slate-400 hover:bg-slate-200 hover:text-slate-600"
-                                        >
-                                            <X className="h-4 w-4" />
-                                        </button>
-                                    </div>
-                                ))}
+                                    );
+                                })}
                             </div>
                         </div>
                     )}
@@ -1,6 +1,6 @@
 "use client";
 
-import { useRef, useState, useCallback } from "react";
+import { useRef, useState, useCallback, useEffect } from "react";
 import Link from "next/link";
 import {
     AlertCircle,
@@ -40,6 +40,17 @@ export default function RemoveBackgroundPage() {
     const [gridDilate, setGridDilate] = useState(1);
     const fileInputRef = useRef<HTMLInputElement>(null);
 
+    // Object URLs pin their Blob until revoked; release each one once it is replaced.
+    useEffect(() => {
+        if (!previewUrl) return;
+        return () => URL.revokeObjectURL(previewUrl);
+    }, [previewUrl]);
+
+    useEffect(() => {
+        if (!resultUrl) return;
+        return () => URL.revokeObjectURL(resultUrl);
+    }, [resultUrl]);
+
     const activeMethod: RemoveMethod = pixelArtMode ? pixelMethod : "ai";
     const methodLabel =
         activeMethod === "ai"
@@ -369,6 +380,7 @@ export default function RemoveBackgroundPage() {
                                         <img
                                             src={previewUrl}
                                             alt="Original"
+                                            decoding="async"
                                             className="w-full h-full object-contain"
                                         />
                                     </div>
@@ -390,6 +402,7 @@ export default function RemoveBackgroundPage() {
                                         <img
                                             src={resultUrl}
                                             alt="Result"
+                                            decoding="async"
                                             className="w-full h-full object-contain"
                                         />
                                     </div>
@@ -1058,6 +1058,8 @@ export default function TrackingPage() {
                             <img
                               src={item.image_url}
                               alt="Preview"
+                              loading="lazy"
+                              decoding="async"
                               className="w-full h-full object-cover"
                               onError={(e) => {
                                 (e.target as HTMLImageElement).style.display = 'none';
@@ -1108,6 +1110,7 @@ export default function TrackingPage() {
             <img
               src={previewImage}
               alt="Full preview"
+              decoding="async"
               className="max-w-full max-h-[85vh] rounded-2xl shadow-2xl ring-1 ring-white/10"
               onClick={(e) => e.stopPropagation()}
             />
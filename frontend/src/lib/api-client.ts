@@ -1,3 +1,6 @@
+import { encodeWebPInBrowser, runPool } from './file-utils';
+import { safeEntryName, ZipWriter } from './zip';
+
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8080';
 const ANALYTICS_BASE_URL =
     (process.env.NEXT_PUBLIC_ANALYTICS_URL || 'https://plant.cemsoftwareltd.com').replace(
@@ -145,13 +148,45 @@ class APIClient {
         this.baseURL = API_BASE_URL;
     }
 
-    async uploadVideo(file: File): Promise<ConversionResponse> {
-        const formData = new FormData();
-        formData.append('file', file);
+    // Single-file endpoints take the File as the raw body and their scalar
+    // options in the query string, so no multipart envelope is built.
+    private async postRawFile(
+        path: string,
+        file: File,
+        params: Record<string, number | undefined> = {}
+    ): Promise<Blob> {
+        const query = new URLSearchParams();
+        for (const [key, value] of Object.entries(params)) {
+            if (value) query.append(key, value.toString());
+        }
+        const queryString = query.toString();
 
-        const response = await fetch(`${this.baseURL}/upload`, {
+        const response = await fetch(`${this.baseURL}${path}${queryString ? `?${queryString}` : ''}`, {
             method: 'POST',
-            body: formData,
+            headers: {
+                'Content-Type': 'application/octet-stream',
+                'X-Original-Name': encodeURIComponent(file.name),
+            },
+            body: file,
+        });
+
+        if (!response.ok) {
+            throw new Error(await response.text());
+        }
+
+        return response.blob();
+    }
+
+    async uploadVideo(file: File): Promise<ConversionResponse> {
+        // Send the File itself as the body: the browser streams it from disk
+        // without first assembling a multipart envelope around it.
+        const response = await fetch(`${this.baseURL}/upload-stream`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/octet-stream',
+                'X-Original-Name': encodeURIComponent(file.name),
+            },
+            body: file,
         });
 
         if (!response.ok) {
@@ -194,13 +229,13 @@ class APIClient {
         return response.json();
     }
 
-    async convertFPS(fileId: string, fps: number): Promise<Blob> {
+    async convertFPS(fileId: string, fps: number, previewDuration?: number): Promise<Blob> {
         const response = await fetch(`${this.baseURL}/convert`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify({ file_id: fileId, fps }),
+            body: JSON.stringify({ file_id: fileId, fps, preview_duration: previewDuration }),
         });
 
         if (!response.ok) {
@@ -227,38 +262,19 @@ class APIClient {
     }
 
     async convertImageToWebP(file: File): Promise<Blob> {
-        const formData = new FormData();
-        formData.append('file', file);
-
-        const response = await fetch(`${this.baseURL}/png-to-webp`, {
-            method: 'POST',
-            body: formData,
-        });
-
-        if (!response.ok) {
-            throw new Error(await response.text());
+        // JPEG sources are encoded lossy at q80 on the server as well, so the
+        // browser's own WebP encoder gives the same result without a round
+        // trip. PNG stays on the server, which encodes it losslessly.
+        if (/\.jpe?g$/i.test(file.name)) {
+            const encoded = await encodeWebPInBrowser(file, 0.8).catch(() => null);
+            if (encoded) return encoded;
         }
 
-        return response.blob();
+        return this.postRawFile('/png-to-webp', file);
     }
 
     async convertGifToWebP(file: File, fps: number, width?: number, duration?: number): Promise<Blob> {
-        const formData = new FormData();
-        formData.append('file', file);
-        formData.append('fps', fps.toString());
-        if (width) formData.append('width', width.toString());
-        if (duration) formData.append('duration', duration.toString());
-
-        const response = await fetch(`${this.baseURL}/gif-to-webp`, {
-            method: 'POST',
-            body: formData,
-        });
-
-        if (!response.ok) {
-            throw new Error(await response.text());
-        }
-
-        return response.blob();
+        return this.postRawFile('/gif-to-webp', file, { fps, width, duration });
     }
 
     async convertMp4ToAnimatedWebP(
@@ -267,40 +283,11 @@ class APIClient {
         width?: number,
         duration?: number
     ): Promise<Blob> {
-        const formData = new FormData();
-        formData.append('file', file);
-        formData.append('fps', fps.toString());
-        if (width) formData.append('width', width.toString());
-        if (duration) formData.append('duration', duration.toString());
-
-        const response = await fetch(`${this.baseURL}/mp4-to-animated-webp`, {
-            method: 'POST',
-            body: formData,
-        });
-
-        if (!response.ok) {
-            throw new Error(await response.text());
-        }
-
-        return response.blob();
+        return this.postRawFile('/mp4-to-animated-webp', file, { fps, width, duration });
     }
 
     async convertWebmToGif(file: File, fps: number, width?: number): Promise<Blob> {
-        const formData = new FormData();
-        formData.append('file', file);
-        formData.append('fps', fps.toString());
-        if (width) formData.append('width', width.toString());
-
-        const response = await fetch(`${this.baseURL}/webm-to-gif`, {
-            method: 'POST',
-            body: formData,
-        });
-
-        if (!response.ok) {
-            throw new Error(await response.text());
-        }
-
-        return response.blob();
+        return this.postRawFile('/webm-to-gif', file, { fps, width });
     }
 
     async imagesToAnimatedWebP(files: File[], fps: number, width?: number): Promise<Blob> {
@@ -321,65 +308,71 @@ class APIClient {
         return response.blob();
     }
 
-    async imagesToWebPZip(files: File[]): Promise<BatchToWebpResult> {
-        const formData = new FormData();
-        files.forEach((file) => formData.append('files', file));
-
-        const response = await fetch(`${this.baseURL}/images-to-webp-zip`, {
-            method: 'POST',
-            body: formData,
+    async imagesToWebPZip(
+        files: File[] | AsyncIterable<File>,
+        output?: WritableStream | null
+    ): Promise<BatchToWebpResult> {
+        // One request per image keeps uploads overlapping with server-side
+        // encoding. Each result is streamed into the archive as soon as it
+        // arrives - straight to disk when an output stream is given.
+        const writer = output?.getWriter();
+        const parts: BlobPart[] = [];
+        const zip = new ZipWriter(async (chunk) => {
+            if (writer) await writer.write(chunk);
+            else parts.push(chunk);
         });
-
-        const contentType = response.headers.get('content-type') || '';
-
-        // Check if response is JSON (partial success or all failed)
-        if (contentType.includes('application/json')) {
-            const jsonData = await response.json();
-
-            if (!response.ok) {
-                // All files failed
-                return {
-                    success: false,
-                    blob: null,
-                    successfulCount: 0,
-                    failedCount: jsonData.failed_count || 0,
-                    failedFiles: jsonData.failed_files || [],
-                    error: jsonData.error || 'Có lỗi xảy ra',
-                };
-            }
-
-            // Partial success - need to download from URL
-            const downloadUrl = `${this.baseURL}${jsonData.download_url}`;
-            const downloadResponse = await fetch(downloadUrl);
-
-            if (!downloadResponse.ok) {
-                throw new Error('Không thể tải file ZIP');
-            }
-
-            const blob = await downloadResponse.blob();
+        const takenNames = new Set<string>();
+        const successfulFiles: string[] = [];
+        const failedFiles: FailedFileInfo[] = [];
+
+        const limit = (typeof navigator !== 'undefined' && navigator.hardwareConcurrency) || 4;
+        try {
+            await runPool(files, limit, async (file, index) => {
+                const name = safeEntryName(file.name, '.webp', index + 1, takenNames);
+                let webp: Blob;
+                try {
+                    webp = await this.convertImageToWebP(file);
+                } catch (reason) {
+                    failedFiles.push({
+                        file: file.name,
+                        error: reason instanceof Error ? reason.message : String(reason),
+                    });
+                    return;
+                }
+                // Not a per-file failure: once the archive can't be written,
+                // every later entry would land in a broken ZIP.
+                await zip.add(name, webp);
+                successfulFiles.push(file.name);
+            });
+            if (successfulFiles.length) await zip.close();
+        } catch (reason) {
+            await writer?.abort(reason).catch(() => undefined);
+            throw reason;
+        }
+
+        if (!successfulFiles.length) {
+            await writer?.abort();
             return {
-                success: true,
-                blob,
-                successfulCount: jsonData.successful_count || 0,
-                successfulFiles: jsonData.successful_files || [],
-                failedCount: jsonData.failed_count || 0,
-                failedFiles: jsonData.failed_files || [],
-                message: jsonData.message,
+                success: false,
+                blob: null,
+                successfulCount: 0,
+                failedCount: failedFiles.length,
+                failedFiles,
+                error: 'Không có file nào được chuyển đổi thành công',
             };
         }
 
-        // Full success - direct blob response
-        if (!response.ok) {
-            throw new Error(await response.text());
-        }
-
-        const blob = await response.blob();
+        await writer?.close();
         return {
             success: true,
-            blob,
-            successfulCount: files.length,
-            failedCount: 0,
-            failedFiles: [],
+            blob: writer ? null : new Blob(parts, { type: 'application/zip' }),
+            successfulCount: successfulFiles.length,
+            successfulFiles,
+            failedCount: failedFiles.length,
+            failedFiles,
+            message: failedFiles.length
+                ? `Đã chuyển đổi ${successfulFiles.length} file thành công, ${failedFiles.length} file bị lỗi`
+                : undefined,
         };
     }
 
@@ -392,14 +385,15 @@ class APIClient {
             lossless?: boolean;
         }
     ): Promise<Blob> {
+        // Options go first so the server can start converting while files upload.
         const formData = new FormData();
-        files.forEach((file) => formData.append('files', file));
         formData.append('format', options.format);
         if (options.width) formData.append('width', options.width.toString());
         if (options.quality) formData.append('quality', options.quality.toString());
         if (typeof options.lossless === 'boolean') {
             formData.append('lossless', options.lossless ? '1' : '0');
         }
+        files.forEach((file) => formData.append('files', file));
 
         const response = await fetch(`${this.baseURL}/images-convert-zip`, {
             method: 'POST',
@@ -419,6 +413,7 @@ class APIClient {
             width?: number;
             quality?: number;
             fps?: number;
+            format?: 'gif' | 'webp';
         }
     ): Promise<Blob> {
         const formData = new FormData();
@@ -426,6 +421,7 @@ class APIClient {
         if (options.width) formData.append('width', options.width.toString());
         if (options.quality) formData.append('quality', options.quality.toString());
         if (options.fps) formData.append('fps', options.fps.toString());
+        if (options.format) formData.append('format', options.format);
 
         const response = await fetch(`${this.baseURL}/tgs-to-gif-zip`, {
             method: 'POST',
@@ -706,21 +702,10 @@ class APIClient {
             sampleRate?: number;
         }
     ): Promise<Blob> {
-        const formData = new FormData();
-        formData.append('file', file);
-        if (options?.bitrate) formData.append('bitrate', options.bitrate.toString());
-        if (options?.sampleRate) formData.append('sample_rate', options.sampleRate.toString());
-
-        const response = await fetch(`${this.baseURL}/audio-to-ogg`, {
-            method: 'POST',
-            body: formData,
+        return this.postRawFile('/audio-to-ogg', file, {
+            bitrate: options?.bitrate,
+            sample_rate: options?.sampleRate,
         });
-
-        if (!response.ok) {
-            throw new Error(await response.text());
-        }
-
-        return response.blob();
     }
 
     async batchAudioToOggZip(
@@ -17,3 +17,122 @@ export const formatBytes = (bytes: number) => {
   const mb = kb / 1024;
   return `${mb.toFixed(2)} MB`;
 };
+
+/**
+ * Run `worker` over every item of `source` with at most `limit` calls in
+ * flight. Items are pulled lazily, so an async source such as a directory
+ * listing is never materialized in memory. `worker` should not throw.
+ */
+export const runPool = async <T>(
+  source: Iterable<T> | AsyncIterable<T>,
+  limit: number,
+  worker: (item: T, index: number) => Promise<void>
+) => {
+  const iterator =
+    Symbol.asyncIterator in source
+      ? (source as AsyncIterable<T>)[Symbol.asyncIterator]()
+      : (source as Iterable<T>)[Symbol.iterator]();
+  let index = 0;
+  const lane = async () => {
+    for (;;) {
+      const next = await iterator.next();
+      if (next.done) return;
+      await worker(next.value, index++);
+    }
+  };
+  await Promise.all(Array.from({ length: Math.max(1, limit) }, lane));
+};
+
+/**
+ * Encode an image to WebP with the browser's built-in encoder. Resolves to
+ * null when the browser cannot produce WebP (Safari silently falls back to
+ * PNG), so callers can fall back to the server.
+ */
+export const encodeWebPInBrowser = async (
+  file: Blob,
+  quality: number
+): Promise<Blob | null> => {
+  if (typeof OffscreenCanvas === "undefined" || typeof createImageBitmap === "undefined") {
+    return null;
+  }
+  const bitmap = await createImageBitmap(file);
+  try {
+    const canvas = new OffscreenCanvas(bitmap.width, bitmap.height);
+    const context = canvas.getContext("2d");
+    if (!context) return null;
+    context.drawImage(bitmap, 0, 0);
+    const blob = await canvas.convertToBlob({ type: "image/webp", quality });
+    return blob.type === "image/webp" ? blob : null;
+  } finally {
+    bitmap.close();
+  }
+};
+
+type SaveFilePicker = (options: {
+  suggestedName?: string;
+  types?: { description: string; accept: Record<string, string[]> }[];
+}) => Promise<FileSystemFileHandle & { createWritable(): Promise<WritableStream> }>;
+
+/**
+ * Ask the user where to save a ZIP and return a writable stream to it, or
+ * null when the File System Access API is unavailable. Must be called from a
+ * user gesture; rejects with an AbortError if the picker is dismissed.
+ */
+export const openZipSaveStream = async (
+  suggestedName: string
+): Promise<WritableStream | null> => {
+  const picker = (window as Window & { showSaveFilePicker?: SaveFilePicker })
+    .showSaveFilePicker;
+  if (!picker) return null;
+  const handle = await picker({
+    suggestedName,
+    types: [{ description: "ZIP", accept: { "application/zip": [".zip"] } }],
+  });
+  return handle.createWritable();
+};
+
+type DirectoryPicker = (options?: {
+  mode?: "read" | "readwrite";
+}) => Promise<FileSystemDirectoryHandle>;
+
+/**
+ * Let the user pick a folder, or resolve to null when the File System Access
+ * API is unavailable. Must be called from a user gesture; rejects with an
+ * AbortError if the picker is dismissed. With `mode: "readwrite"` the same
+ * prompt also grants write access, so files can be created in the folder
+ * later without another gesture.
+ */
+export const pickDirectory = async (
+  mode: "read" | "readwrite" = "read"
+): Promise<FileSystemDirectoryHandle | null> => {
+  const picker = (window as Window & { showDirectoryPicker?: DirectoryPicker })
+    .showDirectoryPicker;
+  return picker ? picker({ mode }) : null;
+};
+
+/** Create (or replace) `name` in a folder picked with write access and return a stream to it. */
+export const openDirectoryFileStream = async (
+  directory: FileSystemDirectoryHandle,
+  name: string
+): Promise<WritableStream> => {
+  const handle = (await directory.getFileHandle(name, { create: true })) as FileSystemFileHandle & {
+    createWritable(): Promise<WritableStream>;
+  };
+  return handle.createWritable();
+};
+
+/** Yield the files of `directory` whose extension is in `extensions`, one at a time. */
+export async function* iterateDirectoryFiles(
+  directory: FileSystemDirectoryHandle,
+  extensions: string[]
+): AsyncGenerator<File> {
+  const entries = (
+    directory as FileSystemDirectoryHandle & { values(): AsyncIterable<FileSystemHandle> }
+  ).values();
+  for await (const handle of entries) {
+    if (handle.kind !== "file") continue;
+    const name = handle.name.toLowerCase();
+    if (!extensions.some((ext) => name.endsWith(ext))) continue;
+    yield (handle as FileSystemFileHandle).getFile();
+  }
+}
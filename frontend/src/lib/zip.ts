@@ -0,0 +1,211 @@
+const CRC_TABLE = (() => {
+  const table = new Uint32Array(256);
+  for (let n = 0; n < 256; n++) {
+    let c = n;
+    for (let k = 0; k < 8; k++) {
+      c = c & 1 ? 0xedb88320 ^ (c >>> 1) : c >>> 1;
+    }
+    table[n] = c >>> 0;
+  }
+  return table;
+})();
+
+export const crc32 = (data: Uint8Array, crc = 0) => {
+  let c = ~crc >>> 0;
+  for (let i = 0; i < data.length; i++) {
+    c = CRC_TABLE[(c ^ data[i]) & 0xff] ^ (c >>> 8);
+  }
+  return ~c >>> 0;
+};
+
+const dosDateTime = (date: Date) => {
+  const time =
+    (date.getHours() << 11) | (date.getMinutes() << 5) | (date.getSeconds() >> 1);
+  const day =
+    ((date.getFullYear() - 1980) << 9) | ((date.getMonth() + 1) << 5) | date.getDate();
+  return { time, day };
+};
+
+// UTF-8 names, CRC and sizes written in a data descriptor after the payload.
+const ENTRY_FLAGS = 0x0808;
+const encoder = new TextEncoder();
+
+// Classic ZIP fields top out here; past them the Zip64 records take over.
+const MAX_UINT16 = 0xffff;
+const MAX_UINT32 = 0xffffffff;
+const ZIP64_VERSION = 45;
+
+/**
+ * Incremental ZIP writer with every entry STORED (no compression).
+ *
+ * The archives only ever carry already-compressed media (WebP, GIF, ...), so
+ * deflating would cost CPU for no size win. Entries are streamed straight to
+ * `write` as they are added and their CRC is computed on the fly, so the
+ * output can go to a file on disk without holding the archive in memory.
+ * Concurrent `add` calls are serialized in call order.
+ *
+ * Archives past 4 GiB or 65535 entries get Zip64 offsets and end records. A
+ * single entry must stay under 4 GiB (its sizes are written in a 32-bit data
+ * descriptor); `add` rejects larger ones before writing anything.
+ *
+ * Once part of an entry has been written, a failure (from `write` or from
+ * reading `data`) leaves the archive unusable: that `add` and every later
+ * `add`/`close` reject with the same error.
+ */
+export class ZipWriter {
+  private offset = 0;
+  private readonly central: Uint8Array[] = [];
+  private pending: Promise<void> = Promise.resolve();
+  private readonly stamp = dosDateTime(new Date());
+  private failure: { error: unknown } | null = null;
+
+  constructor(private readonly write: (chunk: BlobPart) => Promise<void> | void) {}
+
+  add(name: string, data: Blob): Promise<void> {
+    const run = this.pending.then(() => this.writeEntry(name, data));
+    this.pending = run.catch(() => undefined);
+    return run;
+  }
+
+  async close(): Promise<void> {
+    await this.pending;
+    if (this.failure) throw this.failure.error;
+    const centralOffset = this.offset;
+    const centralSize = this.central.reduce((sum, header) => sum + header.length, 0);
+    const count = this.central.length;
+    for (const header of this.central) {
+      await this.write(header);
+    }
+
+    if (count >= MAX_UINT16 || centralSize >= MAX_UINT32 || centralOffset >= MAX_UINT32) {
+      const record = new Uint8Array(56 + 20);
+      const rv = new DataView(record.buffer);
+      rv.setUint32(0, 0x06064b50, true);
+      rv.setBigUint64(4, BigInt(56 - 12), true);
+      rv.setUint16(12, ZIP64_VERSION, true);
+      rv.setUint16(14, ZIP64_VERSION, true);
+      rv.setBigUint64(24, BigInt(count), true);
+      rv.setBigUint64(32, BigInt(count), true);
+      rv.setBigUint64(40, BigInt(centralSize), true);
+      rv.setBigUint64(48, BigInt(centralOffset), true);
+      // Locator: where the Zip64 end record starts.
+      rv.setUint32(56, 0x07064b50, true);
+      rv.setBigUint64(64, BigInt(centralOffset + centralSize), true);
+      rv.setUint32(72, 1, true);
+      await this.write(record);
+    }
+
+    const end = new Uint8Array(22);
+    const ev = new DataView(end.buffer);
+    ev.setUint32(0, 0x06054b50, true);
+    ev.setUint16(8, Math.min(count, MAX_UINT16), true);
+    ev.setUint16(10, Math.min(count, MAX_UINT16), true);
+    ev.setUint32(12, Math.min(centralSize, MAX_UINT32), true);
+    ev.setUint32(16, Math.min(centralOffset, MAX_UINT32), true);
+    await this.write(end);
+  }
+
+  private async writeEntry(name: string, data: Blob) {
+    if (this.failure) throw this.failure.error;
+    if (data.size >= MAX_UINT32) {
+      throw new RangeError(`${name} is too large for a ZIP entry (4 GiB max)`);
+    }
+    try {
+      await this.writeEntryData(name, data);
+    } catch (error) {
+      this.failure = { error };
+      throw error;
+    }
+  }
+
+  private async writeEntryData(name: string, data: Blob) {
+    const encodedName = encoder.encode(name);
+    const { time, day } = this.stamp;
+    const localOffset = this.offset;
+
+    const local = new Uint8Array(30 + encodedName.length);
+    const lv = new DataView(local.buffer);
+    lv.setUint32(0, 0x04034b50, true);
+    lv.setUint16(4, 20, true);
+    lv.setUint16(6, ENTRY_FLAGS, true);
+    lv.setUint16(8, 0, true); // STORED
+    lv.setUint16(10, time, true);
+    lv.setUint16(12, day, true);
+    lv.setUint16(26, encodedName.length, true);
+    local.set(encodedName, 30);
+    await this.write(local);
+
+    let crc = 0;
+    let size = 0;
+    const reader = data.stream().getReader();
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      crc = crc32(value, crc);
+      size += value.length;
+      await this.write(value);
+    }
+
+    const descriptor = new Uint8Array(16);
+    const dv = new DataView(descriptor.buffer);
+    dv.setUint32(0, 0x08074b50, true);
+    dv.setUint32(4, crc, true);
+    dv.setUint32(8, size, true);
+    dv.setUint32(12, size, true);
+    await this.write(descriptor);
+
+    // Past 4 GiB the local header offset moves to a Zip64 extra field.
+    const zip64 = localOffset >= MAX_UINT32;
+    const extraLength = zip64 ? 12 : 0;
+    const header = new Uint8Array(46 + encodedName.length + extraLength);
+    const cv = new DataView(header.buffer);
+    cv.setUint32(0, 0x02014b50, true);
+    cv.setUint16(4, zip64 ? ZIP64_VERSION : 20, true);
+    cv.setUint16(6, zip64 ? ZIP64_VERSION : 20, true);
+    cv.setUint16(8, ENTRY_FLAGS, true);
+    cv.setUint16(10, 0, true);
+    cv.setUint16(12, time, true);
+    cv.setUint16(14, day, true);
+    cv.setUint32(16, crc, true);
+    cv.setUint32(20, size, true);
+    cv.setUint32(24, size, true);
+    cv.setUint16(28, encodedName.length, true);
+    cv.setUint16(30, extraLength, true);
+    cv.setUint32(42, zip64 ? MAX_UINT32 : localOffset, true);
+    header.set(encodedName, 46);
+    if (zip64) {
+      const extraAt = 46 + encodedName.length;
+      cv.setUint16(extraAt, 0x0001, true);
+      cv.setUint16(extraAt + 2, 8, true);
+      cv.setBigUint64(extraAt + 4, BigInt(localOffset), true);
+    }
+    this.central.push(header);
+
+    this.offset += local.length + size + descriptor.length;
+  }
+}
+
+const UNSAFE_NAME_RE = /[^a-zA-Z0-9._-]+/g;
+
+/**
+ * Sanitize an uploaded filename into a unique archive entry name, matching
+ * the backend's `_safe_zip_entry_name` + `_unique_zip_entry_name` rules.
+ */
+export const safeEntryName = (
+  filename: string,
+  ext: string,
+  index: number,
+  taken: Set<string>
+) => {
+  const fallback = `image_${String(index).padStart(4, "0")}`;
+  const dot = filename.lastIndexOf(".");
+  const rawStem = (dot > 0 ? filename.slice(0, dot) : filename).trim();
+  const stem =
+    rawStem.replace(UNSAFE_NAME_RE, "_").replace(/^[._-]+|[._-]+$/g, "") || fallback;
+  let candidate = `${stem}${ext}`;
+  for (let counter = 2; taken.has(candidate); counter++) {
+    candidate = `${stem}_${counter}${ext}`;
+  }
+  taken.add(candidate);
+  return candidate;
+};